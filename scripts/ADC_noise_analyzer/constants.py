@@ -14,6 +14,20 @@ MAX_HALF_PERIOD = 7
 
 DAC_UOB_0V_HEX = 9355
 
+# ILA csv files: a line with the probe names and a line with the radix, then one sample per line
+ILA_HEADER_LINES = 2
+ILA_ADC_COLUMN = 5
+ILA_MIN_COLUMNS = 12
+
+# Parallel loading of the csv files: batches handed to each worker process (more batches balance the load better)
+LOADER_CHUNKS_PER_WORKER = 4
+LOADER_MIN_PARALLEL_FILES = 8 # Fewer files are loaded in the current process
+
+# Cache of the parsed csv files, one per data directory. Increase the version if the parsing changes so the old caches
+# are discarded
+PARSED_CACHE_FILENAME = ".parsed_cache.npz"
+PARSED_CACHE_VERSION = 1
+
 class Vio_parameter(Enum):
     CNV_LENGTH = 1
     SCK_DELAY = 2
@@ -1,8 +1,10 @@
 from genericpath import isdir
 from os import listdir
 from os.path import isfile, join
+import os
 import csv
 import math
+from concurrent.futures import ProcessPoolExecutor
 from numpy.fft import fft, ifft
 import numpy as np
 import matplotlib.pyplot as pyplot
@@ -33,20 +35,15 @@ def generate_graph_parameter_sweep(parameter):
 
 def build_data_dictionary(files, parameter):
     data = {}
-    for file in files:
+    for file, file_data in zip(files, load_files(files)):
         csv_length = file[file.find(parameter.name + "_") + len(parameter.name + "_")]
-        data[csv_length] = extract_data_from_file(file)
+        data[csv_length] = file_data
     return data
 
 def calculate_std_deviations(data):
     std_deviations = {}
     for key in data:
-        mean = calculate_mean_from_array(data[key])
-        sum = 0
-        for value in data[key]:
-            squared_diff = pow(mean - value, 2)
-            sum = sum + squared_diff
-        std_deviations[key] = math.sqrt(sum/len(data[key]))
+        std_deviations[key] = calculate_std_deviation_from_array(data[key])
     return std_deviations
 
 def plot_test1_parameter_data(parameter, data):
@@ -105,11 +102,7 @@ def generate_graph_test_2_scenario(test_2_scenario):
     plot_fft(data, cts.TEST_2_RESULTS_DIRECTORY+"\\fft_"+test_2_scenario.name+".png")
 
 def get_test_2_data(files):
-    data = []
-    for file in files:
-        data.extend(extract_data_from_file(file))
-    mean = calculate_mean_from_array(data)
-    return list(map(lambda x : x - mean, data))
+    return substract_mean_from_array(load_files_concatenated(files))
 
 def plot_test_2_data(data, test_2_scenario):
     fig, ax = pyplot.subplots()
@@ -146,10 +139,7 @@ def generate_graph_test_3_scenario(test_3_scenario):
     plot_test_3_fft(no_mean_data, test_3_scenario)
 
 def get_test_3_data(files):
-    data = []
-    for file in files:
-        data.extend(extract_data_from_file(file))
-    return data
+    return load_files_concatenated(files)
 
 def plot_test_3_data(data, test_3_scenario):
     filename = cts.TEST_3_RESULTS_DIRECTORY+"\\"+test_3_scenario.name+".png"
@@ -197,13 +187,16 @@ def get_test_4_files(attempt : int) -> dict[int, list]:
     return files
 
 def get_test_4_data(files_dict : dict[int, list]) -> dict[int, list]:
+    dac_values = [dac_value for dac_value in files_dict if dac_value >= 1100 and dac_value <= 1800]
+    # The files of all the DAC values are loaded at once so they share the same worker processes
+    files = [file for dac_value in dac_values for file in files_dict[dac_value]]
+    files_data = load_files(files)
     data = {}
-    for dac_value in files_dict:
-        if(dac_value < 1100 or dac_value > 1800):
-            continue
-        data[dac_value] = []
-        for file in files_dict[dac_value]:
-            data[dac_value].extend(extract_data_from_file(file))
+    start = 0
+    for dac_value in dac_values:
+        end = start + len(files_dict[dac_value])
+        data[dac_value] = np.concatenate(files_data[start:end]) if end > start else np.zeros(0)
+        start = end
     return data
 
 def plot_test_4_data(data_dict : dict[int, list], attempt : int):
@@ -222,47 +215,131 @@ def plot_test_4_data_double(data_dict_1 : dict[int, list], data_dict_2 : dict[in
 # Generic
 #######################################################
 
+# Sorted, so the data (and the plots) does not depend on the order of listdir
 def get_folders_of_directory(directory):
-    return list(map(lambda s: "" + directory + "\\" + s, [f for f in listdir(directory) if isdir(join(directory, f))]))
+    return list(map(lambda s: "" + directory + "\\" + s, sorted([f for f in listdir(directory) if isdir(join(directory, f))])))
 
 def get_files_of_directory(directory):
-    return list(map(lambda s: "" + directory + "/" + s, [f for f in listdir(directory) if isfile(join(directory, f))]))
+    return list(map(lambda s: "" + directory + "/" + s, sorted([f for f in listdir(directory)
+                                                               if isfile(join(directory, f)) and f != cts.PARSED_CACHE_FILENAME])))
+
+def load_files(files, max_workers = None, use_cache = True):
+    # Returns the data of each file (see extract_data_from_file) in the same order as files. The files parsed before
+    # are taken from the cache of their directory if they have not changed (same modification time and size), only
+    # the rest are parsed, and the caches are then updated
+    if(not use_cache):
+        return parse_files(files, max_workers)
+
+    caches = {}
+    for file in files:
+        directory = os.path.dirname(file)
+        if(directory not in caches):
+            caches[directory] = read_cache(directory)
+
+    files_data = [None] * len(files)
+    keys = [get_file_key(file) for file in files]
+    missing = []
+    for i in range(len(files)):
+        entry = caches[os.path.dirname(files[i])].get(os.path.basename(files[i]))
+        if(entry != None and entry[0:2] == keys[i]):
+            files_data[i] = entry[2]
+        else:
+            missing.append(i)
+
+    if(len(missing) > 0):
+        for i, file_data in zip(missing, parse_files([files[i] for i in missing], max_workers)):
+            files_data[i] = file_data
+            caches[os.path.dirname(files[i])][os.path.basename(files[i])] = keys[i] + (file_data,)
+        for directory in set(os.path.dirname(files[i]) for i in missing):
+            write_cache(directory, caches[directory])
+    return files_data
+
+def get_file_key(filename : str):
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def read_cache(directory):
+    # Returns {file name : (mtime, size, data)}, empty if there is no valid cache in the directory
+    filename = join(directory, cts.PARSED_CACHE_FILENAME)
+    if(not isfile(filename)):
+        return {}
+    try:
+        with np.load(filename) as cache:
+            if(int(cache["version"]) != cts.PARSED_CACHE_VERSION):
+                return {}
+            # The data of all the files is stored in a single array
+            files_data = np.split(cache["data"], np.cumsum(cache["lengths"])[:-1])
+            return {str(name) : (int(mtime), int(size), file_data) for name, mtime, size, file_data
+                    in zip(cache["files"], cache["mtimes"], cache["sizes"], files_data)}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def write_cache(directory, entries : dict):
+    # The files that do not exist anymore are dropped. The cache is written to a temporary file first so it is never
+    # left half written
+    names = sorted([name for name in entries if isfile(join(directory, name))])
+    filename = join(directory, cts.PARSED_CACHE_FILENAME)
+    f = open(filename + ".tmp", "wb")
+    np.savez(f, version=cts.PARSED_CACHE_VERSION, files=np.array(names, dtype=str),
+             mtimes=np.array([entries[name][0] for name in names], dtype=np.int64),
+             sizes=np.array([entries[name][1] for name in names], dtype=np.int64),
+             lengths=np.array([len(entries[name][2]) for name in names], dtype=np.int64),
+             data=np.concatenate([entries[name][2] for name in names]) if len(names) > 0 else np.zeros(0))
+    f.close()
+    os.replace(filename + ".tmp", filename)
+
+def parse_files(files, max_workers = None):
+    # The files are parsed in parallel by a pool of processes, each one taking batches of files
+    if(len(files) < cts.LOADER_MIN_PARALLEL_FILES):
+        return [extract_data_from_file(file) for file in files]
+    if(max_workers == None):
+        max_workers = os.cpu_count() or 1
+    chunksize = max(1, math.ceil(len(files) / (max_workers * cts.LOADER_CHUNKS_PER_WORKER)))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(extract_data_from_file, files, chunksize=chunksize))
+
+def load_files_concatenated(files):
+    # All the samples of the files in a single array
+    files_data = load_files(files)
+    return np.concatenate(files_data) if len(files_data) > 0 else np.zeros(0)
 
 def extract_data_from_file(filename : str):
+    try:
+        # Only the ADC column is parsed (loadtxt does it in C)
+        adc_values = np.loadtxt(filename, delimiter=",", usecols=cts.ILA_ADC_COLUMN, skiprows=cts.ILA_HEADER_LINES,
+                                dtype=np.int64, ndmin=1)
+    except ValueError:
+        # Not a plain ILA export (e.g. different header or incomplete rows), parsed row by row
+        adc_values = extract_adc_values_from_rows(filename)
+    return clean_adc_values(adc_values)
+
+def extract_adc_values_from_rows(filename : str):
     csvfile = open(filename, newline='')
     reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
     adc_values = []
     for row in reader:
         row_list = row[0].split(",")
-        if(len(row_list) < 12):
+        if(len(row_list) < cts.ILA_MIN_COLUMNS):
             continue
         
-        adc_values.append(int(row_list[5]))
-    return clean_adc_values(adc_values)
+        adc_values.append(int(row_list[cts.ILA_ADC_COLUMN]))
+    csvfile.close()
+    return np.array(adc_values, dtype=np.int64)
 
 def clean_adc_values(adc_values):
-    values = []
-    for i in range(len(adc_values) - 2 ):
-        if(adc_values[i] != 0 and adc_values[i+1] == 0):
-            values.append(convert_adc_value_to_voltage(adc_values[i]))
-    return values
+    # A conversion is complete when a non zero value is followed by a zero (the last two samples are not checked)
+    adc_values = np.asarray(adc_values)
+    edges = (adc_values[:-2] != 0) & (adc_values[1:-1] == 0)
+    return convert_adc_value_to_voltage(adc_values[:-2][edges])
 
 def convert_adc_value_to_voltage(adc_value):
     return adc_value * 1.232 / (2**15 - 1)
 
 def calculate_std_deviation_from_array(values):
-    mean = calculate_mean_from_array(values)
-    sum = 0
-    for value in values:
-        squared_diff = pow(mean - value, 2)
-        sum = sum + squared_diff
-    return math.sqrt(sum/len(values))
+    return float(np.std(values))
 
 def calculate_mean_from_array(values):
-    sum = 0
-    for x in values:
-        sum = sum + x
-    return sum/len(values)
+    return float(np.mean(values))
 
 def substract_mean_from_dict(data_dict : dict[int, list]) -> dict[int, list]:
     no_mean_dict = {}
@@ -271,8 +348,8 @@ def substract_mean_from_dict(data_dict : dict[int, list]) -> dict[int, list]:
     return no_mean_dict
 
 def substract_mean_from_array(values):
-    mean = calculate_mean_from_array(values)
-    return list(map(lambda x : x - mean, values))
+    values = np.asarray(values)
+    return values - calculate_mean_from_array(values)
 
 def plot_array_as_scatter(data, filename):
     fig, ax = pyplot.subplots()
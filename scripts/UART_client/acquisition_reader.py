@@ -0,0 +1,108 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: acquisition_reader.py
+# Description: Reader for the acquisitions recorded by exporter.Acquisition_writer. The segments are memory mapped, so
+#              only the frames that are actually accessed are read from disk and runs bigger than memory can be analysed
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import os
+import json
+import numpy as np
+# Custom imports
+import packet_fields as pf
+import exporter as exporter
+
+class Acquisition_reader():
+    def __init__(self, run_directory : str):
+        self.run_directory = run_directory
+        f = open(os.path.join(run_directory, exporter.METADATA_FILENAME), "r")
+        self.metadata = json.load(f)
+        f.close()
+
+        self.num_rows = self.metadata["num_rows"]
+        self.num_cols = self.metadata["num_cols"]
+        self.frame_dtype = pf.get_frame_dtype(self.num_rows, self.num_cols) if self.num_rows != None else pf.DATA_HEADER_DTYPE
+
+        self.segments = []
+        for segment in self.metadata["segments"]:
+            filename = os.path.join(run_directory, segment["file"])
+            # The number of frames is taken from the file itself, the metadata may be behind if the run did not finish
+            num_frames = os.path.getsize(filename) // self.frame_dtype.itemsize
+            if (num_frames > 0):
+                self.segments.append(np.memmap(filename, dtype = self.frame_dtype, mode = "r", shape = (num_frames,)))
+
+        # First frame index of each segment (plus the total number of frames at the end)
+        self.segment_starts = np.cumsum([0] + [len(s) for s in self.segments])
+
+    def __len__(self):
+        return int(self.segment_starts[-1])
+
+    def __getitem__(self, key):
+        if (isinstance(key, slice)):
+            # Same semantics as Python slicing (negative indexes and steps). Only the frames between the first and the
+            # last selected ones are accessed
+            indexes = range(*key.indices(len(self)))
+            if (len(indexes) == 0):
+                return np.zeros(0, dtype = self.frame_dtype)
+            first = min(indexes[0], indexes[-1])
+            return self.get_frames(first, max(indexes[0], indexes[-1]) + 1)[indexes[0] - first::key.step or 1]
+        if (key < 0):
+            key = key + len(self)
+        if (key < 0 or key >= len(self)):
+            raise IndexError("Frame " + str(key) + " out of range (" + str(len(self)) + " frames)")
+        segment = int(np.searchsorted(self.segment_starts, key, side = "right")) - 1
+        return self.segments[segment][key - self.segment_starts[segment]]
+
+    def get_parameters(self):
+        # Params in effect when the acquisition was started: {param name : list of ints}
+        return self.metadata["parameters"]
+
+    def get_param(self, name : str):
+        # Value of a single param, with or without the "_ID" suffix (e.g. "ROW_LEN"). None if it is not in the snapshot
+        params = self.get_parameters()
+        return params.get(name, params.get(name + "_ID"))
+
+    def get_frames(self, start : int = 0, stop : int = None):
+        # Returns the frames in [start, stop) as a structured array. If they are all in the same segment the result is a
+        # view of the memory map, otherwise only the requested frames are copied. Negative indexes count from the end
+        start, stop, step = slice(start, stop).indices(len(self))
+        if (start >= stop):
+            return np.zeros(0, dtype = self.frame_dtype)
+
+        parts = []
+        for i in range(len(self.segments)):
+            segment_start = int(self.segment_starts[i])
+            segment_stop = int(self.segment_starts[i + 1])
+            if (segment_stop <= start or segment_start >= stop):
+                continue
+            parts.append(self.segments[i][max(start, segment_start) - segment_start:min(stop, segment_stop) - segment_start])
+
+        if (len(parts) == 1):
+            return parts[0]
+        return np.concatenate(parts)
+
+    def get_data(self, start : int = 0, stop : int = None, row = None, channel = None):
+        # Returns the data block of the frames in [start, stop) indexed as [frame, channel, row]. row and channel can be
+        # an index, a slice or None (all of them)
+        data = self.get_frames(start, stop)["data"]
+        return data[:, slice(None) if channel == None else channel, slice(None) if row == None else row]
+
+    def iter_blocks(self, block_size : int, start : int = 0, stop : int = None):
+        # Iterates over the frames in blocks of block_size frames (the last one can be smaller)
+        start, stop, step = slice(start, stop).indices(len(self))
+        for i in range(start, stop, block_size):
+            yield self.get_frames(i, min(i + block_size, stop))
+
+    def close(self):
+        # The maps are released once the arrays returned to the user are not referenced anymore
+        self.segments = []
+        self.segment_starts = np.zeros(1, dtype = np.int64)
@@ -0,0 +1,143 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: async_transport.py
+# Description: asyncio transport for the channel card protocol. A reader task parses the received data continuously,
+#              resolving the awaitable commands when their reply arrives and queuing the data frames, so commands can
+#              be sent while the data stream is being consumed
+#
+#              Example:
+#                  transport = Async_transport(port)
+#                  await transport.start()
+#                  reply = await transport.send_command(sender.build_cmd_packet(...))
+#                  async for frame in transport.data_frames():
+#                      ...
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import asyncio
+import logging
+# Custom imports
+import packet_fields as pf
+import serial_port as sp
+import receiver as receiver
+import sender as sender
+
+logger = logging.getLogger(__name__)
+
+READ_TIMEOUT = 0.05 # Seconds. Max time the reader task waits for data before checking if it has been stopped
+FRAME_QUEUE_SIZE = 4096 # Frames
+
+class Async_transport():
+    def __init__(self, port : sp.Serial_port, frame_queue_size : int = FRAME_QUEUE_SIZE):
+        # The port must be open, its reader thread is the one pulling the data from the OS
+        self.port = port
+        self.parser = receiver.Stream_parser()
+        self.pending = {} # Reply key -> futures of the commands waiting for that reply (in sending order)
+        self.frames = asyncio.Queue(frame_queue_size)
+        self.reader_task = None
+        self.running = False
+        self.error = None # Exception that stopped the reader task
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def start(self):
+        self.running = True
+        self.reader_task = asyncio.create_task(self.read_loop())
+
+    async def close(self):
+        self.running = False
+        if (self.reader_task != None):
+            # Cancelled instead of awaited, it may be blocked on a full frame queue nobody is consuming
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except asyncio.CancelledError:
+                pass
+            self.reader_task = None
+
+        for futures in self.pending.values():
+            for future in futures:
+                if (not future.done()):
+                    future.cancel()
+        self.pending = {}
+        self.end_frames()
+
+    def end_frames(self):
+        # Ends the data_frames iterators. If the queue is full the oldest frame is dropped to make room for the end mark
+        if (self.frames.full()):
+            self.frames.get_nowait()
+            logger.warning("Frame queue full when closing, one frame dropped")
+        self.frames.put_nowait(None)
+
+    async def read_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.running:
+                # The blocking read is done in a worker thread so the event loop is never blocked
+                data = await loop.run_in_executor(None, self.port.read_available_bytes, READ_TIMEOUT)
+                if (len(data) == 0):
+                    continue
+                self.parser.feed(data)
+                for packet in self.parser.packets():
+                    await self.dispatch(packet)
+        except Exception as e:
+            # The commands waiting for a reply fail with the same exception instead of waiting forever
+            logger.error("Reader task stopped: %s", e)
+            self.error = e
+            self.running = False
+            for futures in self.pending.values():
+                for future in futures:
+                    if (not future.done()):
+                        future.set_exception(e)
+            self.pending = {}
+            self.end_frames()
+
+    async def dispatch(self, packet):
+        if (packet.packet_type == pf.Packet_type.DATA):
+            # If the consumer is slower than the card the reader waits here, the data keeps being buffered by the port
+            await self.frames.put(packet)
+        elif (packet.packet_type == pf.Packet_type.REPLY):
+            futures = self.pending.get(sender.get_reply_key(packet), [])
+            while len(futures) > 0:
+                future = futures.pop(0)
+                if (not future.done()):
+                    future.set_result(packet)
+                    return
+            logger.warning("Unexpected reply for param id %s", packet.param_id)
+
+    async def send_command(self, packet : pf.CMD_packet, timeout : float = None):
+        # Returns the reply to the command. Raises asyncio.TimeoutError if it does not arrive before the timeout
+        if (self.error != None):
+            raise self.error
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(sender.get_reply_key(packet), []).append(future)
+        await loop.run_in_executor(None, self.port.write_words, sender.get_packet_words(packet))
+        return await asyncio.wait_for(future, timeout)
+
+    async def read_param(self, param_id : pf.Param_id, timeout : float = None):
+        return await self.send_command(sender.build_cmd_packet(pf.Packet_type.CMD_RB, param_id), timeout)
+
+    async def write_param(self, param_id : pf.Param_id, values : list, timeout : float = None):
+        return await self.send_command(sender.build_cmd_packet(pf.Packet_type.CMD_WB, param_id, values), timeout)
+
+    async def data_frames(self):
+        # Async iterator over the received data frames. It ends when the transport is closed
+        while True:
+            packet = await self.frames.get()
+            if (packet == None):
+                return
+            yield packet
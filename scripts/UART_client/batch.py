@@ -0,0 +1,126 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: batch.py
+# Description: Runs a batch of channel card operations described in a JSON (or YAML, if PyYAML is installed) file.
+#              Example:
+#
+#              {
+#                  "port": "COM4",
+#                  "operations": [
+#                      {"op": "write", "param": "ROW_LEN", "values": [100]},
+#                      {"op": "read",  "param": "ROW_LEN"},
+#                      {"op": "read",  "param": "NUM_ROWS", "cached": true},
+#                      {"op": "sync"},
+#                      {"op": "start", "run_name": "row_len_100"},
+#                      {"op": "start", "run_name": "averaged", "decimation": "boxcar", "decimation_factor": 8},
+#                      {"op": "start", "run_name": "continuous", "wait": false},
+#                      {"op": "sleep", "seconds": 10},
+#                      {"op": "stop"},
+#                      {"op": "sleep", "seconds": 0.5}
+#                  ]
+#              }
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import json
+import time
+# Custom imports
+import channel_card as cc
+
+def load_batch_file(filename : str):
+    f = open(filename, "r")
+    if (filename.endswith(".yaml") or filename.endswith(".yml")):
+        import yaml # Optional dependency, only needed for YAML batch files
+        batch = yaml.safe_load(f)
+    else:
+        batch = json.load(f)
+    f.close()
+
+    # A plain list of operations is also accepted
+    if (isinstance(batch, list)):
+        batch = {"operations" : batch}
+    return batch
+
+def run_batch_file(filename : str, port_name : str = None, output_filename : str = None):
+    batch = load_batch_file(filename)
+    if (port_name == None):
+        port_name = batch.get("port", cc.sp.PORT_NAME)
+
+    card = cc.Channel_card(port_name, batch.get("baudrate", cc.sp.BAUDRATE), batch.get("parity", cc.sp.PARITY))
+    card.open()
+    try:
+        results = run_batch(card, batch["operations"])
+    finally:
+        card.close()
+
+    if (output_filename != None):
+        f = open(output_filename, "w")
+        json.dump(results, f, indent = 4)
+        f.close()
+    return results
+
+def run_batch(card : cc.Channel_card, operations : list):
+    # Returns one result per operation. The batch is stopped at the first failed operation unless the operation sets
+    # "continue_on_error"
+    results = []
+    for operation in operations:
+        result = run_operation(card, operation)
+        print(operation["op"] + ": " + ("OK" if result["ok"] else "ERROR") +
+              ("" if result.get("values") == None else " " + str(result["values"])))
+        results.append(result)
+        if (not result["ok"] and not operation.get("continue_on_error", False)):
+            break
+    return results
+
+def run_operation(card : cc.Channel_card, operation : dict):
+    op = operation["op"]
+    result = {"op" : op}
+
+    if (op == "read" and operation.get("cached", False)):
+        # Served from the param cache, the card is only asked if the value is not known yet
+        param_id = cc.get_param_id(operation["param"])
+        result["param"] = param_id.name
+        result["values"] = card.get_param(param_id)
+        result["ok"] = result["values"] != None
+    elif (op == "read"):
+        param_id = cc.get_param_id(operation["param"])
+        reply = card.read_param(param_id)
+        result["param"] = param_id.name
+        result["ok"] = cc.is_reply_ok(reply)
+        result["values"] = cc.get_reply_values(reply) if reply != None else None
+    elif (op == "write"):
+        param_id = cc.get_param_id(operation["param"])
+        reply = card.write_param(param_id, operation["values"])
+        result["param"] = param_id.name
+        result["ok"] = cc.is_reply_ok(reply)
+    elif (op == "sync"):
+        failed = card.sync_params()
+        result["ok"] = len(failed) == 0
+        result["failed"] = [p.name for p in failed]
+    elif (op == "start"):
+        wait = operation.get("wait", True)
+        reply = card.start_acquisition(operation.get("run_name"), wait = wait, decimation = operation.get("decimation"),
+                                       decimation_factor = operation.get("decimation_factor", 1))
+        # The run directory is removed if the card does not accept the GO command
+        result["ok"] = cc.is_reply_ok(reply)
+        result["run_directory"] = card.writer.run_directory if result["ok"] else None
+        result["frames"] = card.writer.metadata["frames"]
+    elif (op == "stop"):
+        # An acquisition that already finished by itself is reported with the reply to its GO command
+        result["ok"] = cc.is_reply_ok(card.stop_acquisition())
+        result["run_directory"] = card.writer.run_directory if card.writer != None else None
+        result["frames"] = card.writer.metadata["frames"] if card.writer != None else 0
+    elif (op == "sleep"):
+        time.sleep(operation["seconds"])
+        result["ok"] = True
+    else:
+        raise ValueError("Unknown operation: " + op)
+    return result
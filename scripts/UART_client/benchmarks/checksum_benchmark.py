@@ -0,0 +1,60 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: checksum_benchmark.py
+# Description: Measures the per packet cost of the checksum calculation for a data packet of MAX_PAYLOAD words
+#              (43 header words + 24 data words) with the different representations of the words
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import os
+import sys
+import random
+import timeit
+import numpy as np
+
+# The client modules live in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import packet_fields as pf
+import serial_port as sp
+import utils as utils
+
+ITERATIONS = 20000
+
+def python_loop_checksum(words):
+    # Reference implementation with the words already converted to int
+    current_checksum = 0
+    for w in words:
+        current_checksum = current_checksum ^ w
+    return current_checksum
+
+def run_benchmark(name, function):
+    seconds = min(timeit.repeat(function, number = ITERATIONS, repeat = 5))
+    print("{:<40} {:>8.3f} us/packet".format(name, seconds / ITERATIONS * 1e6))
+
+def main():
+    words = [random.getrandbits(32) for i in range(pf.MAX_PAYLOAD)]
+    hex_words = ['{:08x}'.format(w) for w in words]
+    raw = sp.words_to_bytes(words)
+    array_words = np.array(words, dtype = np.uint32)
+
+    expected = python_loop_checksum(words)
+    assert utils.calculate_checksum_words(raw) == expected
+    assert utils.calculate_checksum_words(array_words) == expected
+    assert int(utils.calculate_checksum(hex_words), 16) == expected
+
+    print("Checksum of " + str(pf.MAX_PAYLOAD) + " words (" + str(ITERATIONS) + " packets)")
+    run_benchmark("hex strings (calculate_checksum)", lambda: utils.calculate_checksum(hex_words))
+    run_benchmark("python ints (loop)", lambda: python_loop_checksum(words))
+    run_benchmark("raw bytes (calculate_checksum_words)", lambda: utils.calculate_checksum_words(raw))
+    run_benchmark("uint32 array (calculate_checksum_words)", lambda: utils.calculate_checksum_words(array_words))
+
+if __name__ == "__main__" :
+    main()
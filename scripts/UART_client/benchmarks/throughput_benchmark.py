@@ -0,0 +1,281 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: throughput_benchmark.py
+# Description: Throughput of the acquisition path of the UART client. A synthetic stream of data packets is fed through
+#              each stage in isolation and through the whole chain:
+#                  - serial_port : socket (or pty) -> reader thread -> ring buffer -> read_available_bytes
+#                  - receiver    : Stream_parser over chunks of the raw stream
+#                  - exporter    : Acquisition_writer.write_packet of the parsed packets
+#                  - end_to_end  : serial_port -> receiver.receive_packets -> exporter
+#              For each stage the frames/s, MB/s, latency percentiles (per chunk or per frame) and the peak RSS of the
+#              process so far are reported. The results are stored as JSON so different versions can be compared:
+#
+#                  python throughput_benchmark.py -n 20000 -o results/before.json
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import numpy as np
+
+# The client modules live in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import packet_fields as pf
+import serial_port as sp
+import receiver as receiver
+import exporter as exporter
+import fpga_emulator as fe
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), "results")
+NUM_FRAMES = 20000
+CHUNK_SIZE = 4096 # Bytes fed to the parser at a time in the receiver stage
+PERCENTILES = [50, 90, 99, 99.9]
+
+def build_stream(num_frames : int, num_rows : int, num_cols : int):
+    # Raw bytes of num_frames consecutive data packets, as the card sends them
+    header = np.zeros(pf.HEADER_LENGTH, dtype = np.uint32)
+    header[3] = num_rows
+    header[6] = pf.HEADER_VERSION
+    data = np.arange(num_rows * num_cols, dtype = np.uint32)
+    frames = []
+    for frame_id in range(num_frames):
+        header[1] = frame_id
+        frames.append(fe.build_data_frame(header, data + frame_id))
+    return np.concatenate(frames).tobytes()
+
+def get_peak_rss():
+    # Peak resident set size of the process in MB (None if it can not be measured)
+    if (resource == None):
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def get_result(num_frames : int, num_bytes : int, seconds : float, latencies : list, latency_unit : str):
+    latencies = np.array(latencies) * 1e6
+    return {
+        "frames"            : num_frames,
+        "bytes"             : num_bytes,
+        "seconds"           : seconds,
+        "frames_per_second" : num_frames / seconds,
+        "mb_per_second"     : num_bytes / seconds / 1e6,
+        "latency_unit"      : latency_unit,
+        "latency_us"        : {"p" + str(p) : float(np.percentile(latencies, p)) for p in PERCENTILES} if len(latencies) > 0 else {},
+        "latency_max_us"    : float(latencies.max()) if len(latencies) > 0 else None,
+        "peak_rss_mb"       : get_peak_rss()
+    }
+
+class Stream_source():
+    # Serves the stream over a local socket (or a pty) from a background thread, as the card would
+    def __init__(self, stream : bytes, transport : str):
+        self.stream = stream
+        self.transport = transport
+        self.server = None
+        self.master_fd = self.slave_fd = None
+        if (transport == "pty"):
+            import tty # POSIX only
+            self.master_fd, self.slave_fd = os.openpty()
+            tty.setraw(self.slave_fd)
+            self.port_name = os.ttyname(self.slave_fd)
+        else:
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.bind(("localhost", 0))
+            self.server.listen(1)
+            self.port_name = "socket://localhost:" + str(self.server.getsockname()[1])
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target = self.send, daemon = True)
+        self.thread.start()
+
+    def send(self):
+        if (self.transport == "pty"):
+            view = memoryview(self.stream)
+            while len(view) > 0:
+                view = view[os.write(self.master_fd, view[:65536]):]
+        else:
+            connection, address = self.server.accept()
+            connection.sendall(self.stream)
+            # Keep the connection open until the client has read everything
+            connection.recv(1)
+            connection.close()
+
+    def close(self):
+        for fd in [self.master_fd, self.slave_fd]:
+            if (fd != None):
+                os.close(fd)
+        if (self.server != None):
+            self.server.close()
+
+def open_port(source : Stream_source):
+    port = sp.Serial_port()
+    port.open(source.port_name)
+    return port
+
+def benchmark_serial_port(stream : bytes, num_frames : int, transport : str):
+    # Latency: time between consecutive chunks returned by read_available_bytes
+    source = Stream_source(stream, transport)
+    port = open_port(source)
+    latencies = []
+    received = 0
+    start = time.perf_counter()
+    source.start()
+    last = start
+    while received < len(stream):
+        data = port.read_available_bytes(sp.TIMEOUT)
+        if (len(data) == 0):
+            break
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+        received = received + len(data)
+    seconds = time.perf_counter() - start
+    port.close()
+    source.close()
+    return get_result(num_frames * received // len(stream), received, seconds, latencies, "chunk")
+
+def benchmark_receiver(stream : bytes, num_frames : int):
+    # Latency: time to parse each chunk of CHUNK_SIZE bytes
+    parser = receiver.Stream_parser()
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    for i in range(0, len(stream), CHUNK_SIZE):
+        chunk_start = time.perf_counter()
+        parser.feed(stream[i:i + CHUNK_SIZE])
+        for p in parser.packets():
+            frames = frames + 1
+        latencies.append(time.perf_counter() - chunk_start)
+    seconds = time.perf_counter() - start
+    return get_result(frames, len(stream), seconds, latencies, "chunk")
+
+def benchmark_exporter(stream : bytes, num_frames : int, directory : str):
+    # Latency: time to write each frame
+    parser = receiver.Stream_parser()
+    parser.feed(stream)
+    packets = list(parser.packets())
+    latencies = []
+    start = time.perf_counter()
+    with exporter.Acquisition_writer("exporter", directory) as writer:
+        for p in packets:
+            frame_start = time.perf_counter()
+            writer.write_packet(p)
+            latencies.append(time.perf_counter() - frame_start)
+    seconds = time.perf_counter() - start
+    return get_result(len(packets), len(stream), seconds, latencies, "frame")
+
+def benchmark_end_to_end(stream : bytes, num_frames : int, transport : str, directory : str):
+    # Latency: time between consecutive frames written to disk
+    source = Stream_source(stream, transport)
+    port = open_port(source)
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    source.start()
+    last = start
+    with exporter.Acquisition_writer("end_to_end", directory) as writer:
+        for p in receiver.receive_packets(sp.TIMEOUT, receiver.Stream_parser(), port):
+            writer.write_packet(p)
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+            frames = frames + 1
+            if (frames == num_frames):
+                break
+    seconds = time.perf_counter() - start
+    port.close()
+    source.close()
+    return get_result(frames, len(stream) * frames // num_frames, seconds, latencies, "frame")
+
+def get_version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL,
+                                       cwd = os.path.dirname(os.path.realpath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_result(stage : str, result : dict):
+    latency = result["latency_us"]
+    print("{:<12} {:>10.0f} frames/s {:>8.2f} MB/s   p50 {:>9.1f} us   p99 {:>9.1f} us   peak RSS {} MB".format(
+          stage, result["frames_per_second"], result["mb_per_second"], latency.get("p50", 0), latency.get("p99", 0),
+          "-" if result["peak_rss_mb"] == None else "{:.1f}".format(result["peak_rss_mb"])))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Throughput benchmark of the UART client acquisition path")
+    parser.add_argument("-n", "--frames", type = int, default = NUM_FRAMES, help = "Number of frames of the stream")
+    parser.add_argument("-r", "--rows", type = int, default = pf.MAX_ROWS, help = "Rows per frame")
+    parser.add_argument("-c", "--cols", type = int, default = pf.MAX_CHANNELS, help = "Channels per frame")
+    parser.add_argument("-t", "--transport", choices = ["socket", "pty"], default = "socket", help = "Transport of the port stages")
+    parser.add_argument("-s", "--stages", nargs = "+", default = ["serial_port", "receiver", "exporter", "end_to_end"])
+    parser.add_argument("-o", "--output", default = None, help = "JSON file of the results (default: results/<date>.json)")
+    args = parser.parse_args()
+
+    stream = build_stream(args.frames, args.rows, args.cols)
+    directory = tempfile.mkdtemp()
+    print("Stream of " + str(args.frames) + " frames (" + str(args.rows) + " rows x " + str(args.cols) + " channels, " +
+          "{:.2f}".format(len(stream) / 1e6) + " MB)")
+
+    results = {
+        "version"       : get_version(),
+        "date"          : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform"      : platform.platform(),
+        "python"        : platform.python_version(),
+        "numpy"         : np.__version__,
+        "frames"        : args.frames,
+        "rows"          : args.rows,
+        "cols"          : args.cols,
+        "transport"     : args.transport,
+        "stages"        : {}
+    }
+    try:
+        for stage in args.stages:
+            if (stage == "serial_port"):
+                result = benchmark_serial_port(stream, args.frames, args.transport)
+            elif (stage == "receiver"):
+                result = benchmark_receiver(stream, args.frames)
+            elif (stage == "exporter"):
+                result = benchmark_exporter(stream, args.frames, directory)
+            elif (stage == "end_to_end"):
+                result = benchmark_end_to_end(stream, args.frames, args.transport, directory)
+            else:
+                print("[ERROR] Unknown stage: " + stage)
+                continue
+            results["stages"][stage] = result
+            print_result(stage, result)
+    finally:
+        shutil.rmtree(directory)
+
+    output = args.output
+    if (output == None):
+        output = os.path.join(RESULTS_DIRECTORY, time.strftime("%Y%m%d_%H%M%S") + ".json")
+    if (os.path.dirname(output) != ""):
+        os.makedirs(os.path.dirname(output), exist_ok = True)
+    f = open(output, "w")
+    json.dump(results, f, indent = 4)
+    f.close()
+    print("Results saved to \"" + output + "\"")
+
+if __name__ == "__main__" :
+    main()
@@ -0,0 +1,163 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: card_manager.py
+# Description: Runs the acquisition of several channel cards at the same time. Each card has its own port (with its
+#              own reader thread) and its own acquisition thread, and the frames of all the cards are merged by frame id
+#              so the output is time aligned: frame i of every card belongs to the same frame id.
+#              Each card is stored in its own sub directory of the run (card_0, card_1, ...)
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import time
+import queue
+import threading
+# Custom imports
+import serial_port as sp
+import sender as sender
+import exporter as exporter
+import frame_decoder as fd
+import channel_card as cc
+import decimator as decimator
+
+FRAME_QUEUE_SIZE = 4096 # Frames (of all the cards) waiting to be merged
+
+class Frame_sink():
+    # Passed to sender.acquire in place of an Acquisition_writer, hands the frames of one card over to the merger. The
+    # metadata (e.g. the params snapshot) goes to the given dict, usually the one of the writer of the card
+    def __init__(self, card_index : int, frames : queue.Queue, metadata : dict = None):
+        self.card_index = card_index
+        self.frames = frames
+        self.metadata = metadata if metadata != None else {}
+
+    def write_packet(self, packet):
+        self.frames.put((self.card_index, packet))
+
+    def flush(self):
+        # The frames are written by the Acquisition_writer of each card once they are merged
+        pass
+
+class Card_manager():
+    def __init__(self, port_names : list, baudrate : int = sp.BAUDRATE, parity : str = sp.PARITY,
+                 timeout : float = sp.TIMEOUT):
+        self.cards = [cc.Channel_card(port_name, baudrate, parity, timeout) for port_name in port_names]
+        self.run_directory = None
+        self.writers = []
+        self.replies = [None] * len(self.cards) # Reply to the GO command of each card
+        self.errors = [0] * len(self.cards) # Parsing errors of each card
+        self.dropped_frames = 0 # Frames not received by all the cards
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        for card in self.cards:
+            card.open()
+
+    def close(self):
+        for card in self.cards:
+            card.close()
+
+    def read_param(self, param_id):
+        return [card.read_param(param_id) for card in self.cards]
+
+    def write_param(self, param_id, values : list):
+        return [card.write_param(param_id, values) for card in self.cards]
+
+    def acquire(self, run_name : str = None, directory : str = exporter.DATA_DIRECTORY,
+                timeout : float = sender.ACQUISITION_TIMEOUT, decimation : str = None, decimation_factor : int = 1):
+        # Acquires from all the cards until all of them stop sending data. Only the frames received from every card are
+        # stored (reduced by the decimator if decimation is given, see decimator.MODES). Returns the replies to the GO
+        # commands
+        if (run_name == None):
+            run_name = time.strftime("run_%Y%m%d_%H%M%S")
+        self.run_directory = exporter.create_run_directory(directory, run_name)
+        self.writers = [decimator.wrap_writer(exporter.Acquisition_writer("card_" + str(i), self.run_directory,
+                                                                          metadata = {"card_index" : i,
+                                                                                      "port" : self.cards[i].port_name}),
+                                              decimation, decimation_factor)
+                        for i in range(len(self.cards))]
+
+        metadata = [writer.metadata for writer in self.writers]
+        for frame_id, packets in self.iter_aligned_frames(timeout, metadata):
+            for writer, packet in zip(self.writers, packets):
+                writer.write_packet(packet)
+
+        for writer in self.writers:
+            writer.metadata["dropped_frames"] = self.dropped_frames
+            writer.close()
+        return self.replies
+
+    def iter_aligned_frames(self, timeout : float = sender.ACQUISITION_TIMEOUT, metadata : list = None):
+        # Starts the acquisition on all the cards and yields (frame_id, [packet of each card]) in frame id order. The
+        # params snapshot of each card is stored in its dict of metadata, if given
+        if (metadata == None):
+            metadata = [{} for card in self.cards]
+        frames = queue.Queue(FRAME_QUEUE_SIZE)
+        threads = [threading.Thread(target = self.run_card, args = (i, frames, timeout, metadata[i]), daemon = True)
+                   for i in range(len(self.cards))]
+        for thread in threads:
+            thread.start()
+
+        self.dropped_frames = 0
+        num_cards = len(self.cards)
+        pending = {} # Frame id -> packet of each card (None if not received yet)
+        finished = set() # Cards that have finished
+        last_dropped_id = -1 # Last frame id dropped because a card had already finished
+        while len(finished) < num_cards:
+            card_index, packet = frames.get()
+
+            if (packet == None):
+                # The card has finished, the frames it has not sent will never be completed
+                finished.add(card_index)
+                incomplete = [f for f in pending if pending[f][card_index] == None]
+                for f in incomplete:
+                    del pending[f]
+                self.dropped_frames = self.dropped_frames + len(incomplete)
+                continue
+
+            frame_id = fd.get_frame_id(packet.payload)
+            if (len(finished) > 0 and frame_id not in pending):
+                # A finished card has not sent this frame (the pending frames all have its packet), it is dropped right
+                # away instead of being held until the end. Each frame id is counted once, the ids of each card increase
+                if (frame_id > last_dropped_id):
+                    self.dropped_frames = self.dropped_frames + 1
+                    last_dropped_id = frame_id
+                continue
+
+            # The frames of each card arrive in order, so if this card has not sent a previous frame it has lost it
+            lost = [f for f in pending if f < frame_id and pending[f][card_index] == None]
+            for f in lost:
+                del pending[f]
+            self.dropped_frames = self.dropped_frames + len(lost)
+
+            packets = pending.setdefault(frame_id, [None] * num_cards)
+            packets[card_index] = packet
+            if (all(p != None for p in packets)):
+                # Given the in-order arrival, frames are always completed in frame id order
+                del pending[frame_id]
+                yield frame_id, packets
+
+        for thread in threads:
+            thread.join()
+        self.dropped_frames = self.dropped_frames + len(pending)
+
+    def run_card(self, card_index : int, frames : queue.Queue, timeout : float, metadata : dict):
+        try:
+            card = self.cards[card_index]
+            self.replies[card_index], self.errors[card_index] = sender.acquire(Frame_sink(card_index, frames, metadata),
+                                                                               timeout, card.port, card.params)
+        finally:
+            # Tells the merger that this card has finished
+            frames.put((card_index, None))
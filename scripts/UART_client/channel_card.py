@@ -0,0 +1,153 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: channel_card.py
+# Description: Library level client of the channel card. Gives access to the same operations of the interactive
+#              uart client (read/write parameters, start/stop acquisitions) without any user input, so they can be
+#              used from scripts, sweeps and batch files
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+# Custom imports
+import packet_fields as pf
+import serial_port as sp
+import sender as sender
+import exporter as exporter
+import decimator as decimator
+import param_cache as param_cache
+
+class Channel_card():
+    def __init__(self, port_name : str = sp.PORT_NAME, baudrate : int = sp.BAUDRATE, parity : str = sp.PARITY,
+                 timeout : float = sp.TIMEOUT):
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.parity = parity
+        self.timeout = timeout
+        self.port = sp.Serial_port()
+        self.params = param_cache.Param_cache(self.port, timeout) # Mirror of the params of the card
+        self.writer = None # Writer of the last acquisition
+        self.acquisition_thread = None # Acquisition running in the background
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.port.open(self.port_name, self.baudrate, self.parity)
+
+    def close(self):
+        if (self.acquisition_thread != None):
+            self.stop_acquisition()
+        self.port.close()
+
+    def is_acquisition_running(self):
+        return self.acquisition_thread != None and self.acquisition_thread.is_alive()
+
+    def check_no_acquisition(self):
+        # The card ignores the commands during an acquisition, and their replies would be read by the acquisition thread
+        if (self.is_acquisition_running()):
+            raise RuntimeError("The card ignores the commands during an acquisition, stop it first")
+
+    def read_param(self, param_id : pf.Param_id):
+        # Returns the Reply_packet (None if no reply was received). The card is always asked, use get_param to read the
+        # cached value
+        self.check_no_acquisition()
+        reply_packet = sender.read_param(param_id, self.timeout, self.port)
+        self.params.update(param_id, reply_packet)
+        return reply_packet
+
+    def write_param(self, param_id : pf.Param_id, values : list):
+        # The cached value is updated if the card replies OK
+        self.check_no_acquisition()
+        return self.params.write(param_id, values)
+
+    def get_param(self, param_id : pf.Param_id, refresh : bool = False):
+        # Value of the param as a list of ints (None if it could not be read). Only asks the card if the value is not
+        # cached or refresh is set, so the cached values can also be read during an acquisition
+        if (refresh or param_id not in self.params):
+            self.check_no_acquisition()
+        return self.params.read(param_id, refresh)
+
+    def sync_params(self):
+        # Reads all the params into the cache with a single write. Returns the params that could not be read
+        self.check_no_acquisition()
+        return self.params.sync_all()
+
+    def send_commands(self, packets : list):
+        # Sends all the commands with a single write, returns the replies in the same order
+        self.check_no_acquisition()
+        return sender.send_commands(packets, self.timeout, self.port)
+
+    def start_acquisition(self, run_name : str = None, directory : str = exporter.DATA_DIRECTORY,
+                          timeout : float = sender.ACQUISITION_TIMEOUT, wait : bool = True, decimation : str = None,
+                          decimation_factor : int = 1):
+        # Runs an acquisition, storing the frames in a new run directory (self.writer.run_directory). Returns when the
+        # card stops sending data for timeout seconds. Returns the reply to the GO command, if the card does not accept
+        # it (sender.is_go_ok) no run directory is left behind.
+        # With wait = False the acquisition runs in the background until stop_acquisition() is called, the reply to the
+        # GO command is returned as soon as it is received. With decimation (one of decimator.MODES) every
+        # decimation_factor frames are reduced before storing them
+        self.check_no_acquisition()
+        self.writer = decimator.wrap_writer(exporter.Acquisition_writer(run_name, directory), decimation, decimation_factor)
+        if (not wait):
+            self.acquisition_thread = sender.Acquisition_thread(self.writer, timeout, self.port, params = self.params)
+            reply_packet = self.acquisition_thread.start()
+            if (not sender.is_go_ok(reply_packet)):
+                self.acquisition_thread = None
+            return reply_packet
+
+        reply_packet, errors = sender.acquire(self.writer, timeout, self.port, self.params)
+        if (sender.is_go_ok(reply_packet)):
+            self.writer.close()
+        else:
+            self.writer.discard()
+        return reply_packet
+
+    def stop_acquisition(self):
+        # Returns the reply to the ST command. A background acquisition is drained first: the frames still in flight are
+        # written and the writer is closed before returning. If it had already finished by itself (e.g. the card sent
+        # its last frame) no ST command is sent and the reply to the GO command is returned instead
+        if (self.acquisition_thread != None):
+            self.acquisition_thread.stop()
+            if (self.acquisition_thread.finished):
+                reply_packet = self.acquisition_thread.reply_packet
+            else:
+                reply_packet = self.acquisition_thread.stop_reply_packet
+            self.acquisition_thread = None
+            return reply_packet
+        return sender.send_command(sender.build_cmd_packet(pf.Packet_type.CMD_ST, pf.Param_id.RET_DATA_ID), self.timeout,
+                                   self.port)
+
+def get_param_id(name):
+    # Accepts the param name with or without the "_ID" suffix (e.g. "ROW_LEN" or "ROW_LEN_ID") or its hex value
+    # (e.g. "0x30")
+    if (isinstance(name, pf.Param_id)):
+        return name
+    name = str(name).upper()
+    if (name in pf.Param_id.__members__):
+        return pf.Param_id[name]
+    if (name + "_ID" in pf.Param_id.__members__):
+        return pf.Param_id[name + "_ID"]
+    try:
+        if (int(name, 16) in pf.PARAM_ID_FROM_HALF_WORD):
+            return pf.PARAM_ID_FROM_HALF_WORD[int(name, 16)]
+    except ValueError:
+        pass
+    raise ValueError("Unknown param id: " + name)
+
+def is_reply_ok(reply_packet):
+    return reply_packet != None and reply_packet.err_ok == pf.Ok_err.OK
+
+def get_reply_values(reply_packet):
+    # Payload of the reply as ints
+    return [int(w) for w in reply_packet.payload]
@@ -0,0 +1,134 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: decimator.py
+# Description: Downsampling stage between the receiver and the exporter. Wraps an Acquisition_writer and reduces every
+#              block of factor consecutive frames (per row and channel) before writing it:
+#                  - decimate : keeps the first frame of the block
+#                  - boxcar   : mean of the block (rounded to the nearest integer)
+#                  - envelope : min and max of the block, written as two consecutive frames (min first)
+#              The header of the output frames is the one of the first frame of the block, with the status bits of all
+#              the frames of the block (so the last frame flag is kept). The frames are buffered and reduced in batches
+#              of batch_blocks blocks at once. The mode and factor are stored in the run metadata ("decimation")
+#
+#              Example:
+#                  writer = decimator.Decimator(exporter.Acquisition_writer(), "boxcar", 8)
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import numpy as np
+# Custom imports
+import packet_fields as pf
+import utils as utils
+
+MODES = ["decimate", "boxcar", "envelope"]
+BATCH_BLOCKS = 64 # Blocks reduced at once
+
+class Decimator():
+    def __init__(self, writer, mode : str = "boxcar", factor : int = 2, batch_blocks : int = BATCH_BLOCKS):
+        if (mode not in MODES):
+            raise ValueError("Unknown decimation mode: " + str(mode) + " (expected one of " + ", ".join(MODES) + ")")
+        if (factor < 1):
+            raise ValueError("The decimation factor must be at least 1, got " + str(factor))
+        self.writer = writer
+        self.mode = mode
+        self.factor = factor
+        self.batch_size = batch_blocks * factor # Frames
+        self.batch = None # Buffered frames, allocated with the first frame once the payload size is known
+        self.num_frames = 0 # Frames in the batch
+
+        # Same attributes as the writer, so the decimator can be used in its place
+        self.run_directory = writer.run_directory
+        self.metadata = writer.metadata
+        self.metadata["decimation"] = {"mode" : mode, "factor" : factor, "input_frames" : 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_packet(self, packet : pf.Data_packet):
+        self.write_frame(packet.payload)
+
+    def write_frame(self, payload):
+        words = utils.as_word_array(payload)
+        if (self.batch is None):
+            self.batch = np.empty((self.batch_size, len(words)), dtype = np.uint32)
+        elif (len(words) != self.batch.shape[1]):
+            raise ValueError("Frame size changed during the acquisition: " + str(len(words)) + " words, expected " +
+                             str(self.batch.shape[1]))
+
+        self.batch[self.num_frames] = words
+        self.num_frames = self.num_frames + 1
+        self.metadata["decimation"]["input_frames"] += 1
+        if (self.num_frames == self.batch_size):
+            self.reduce_batch(False)
+
+    def reduce_batch(self, partial : bool):
+        # Writes the complete blocks of the batch (and the incomplete one at the end if partial), the remaining frames
+        # are moved to the start of the batch
+        if (self.num_frames == 0):
+            return
+        complete = self.num_frames - self.num_frames % self.factor
+        if (complete > 0):
+            self.write_frames(reduce_blocks(self.batch[0:complete], self.mode, self.factor))
+        remaining = self.num_frames - complete
+        if (partial and remaining > 0):
+            self.write_frames(reduce_blocks(self.batch[complete:self.num_frames], self.mode, remaining))
+            remaining = 0
+        self.batch[0:remaining] = self.batch[complete:complete + remaining]
+        self.num_frames = remaining
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.writer.write_frame(frame)
+
+    def flush(self):
+        # Only the complete blocks are written, so the blocks stay aligned if the acquisition goes on
+        self.reduce_batch(False)
+        self.writer.flush()
+
+    def close(self):
+        self.reduce_batch(True)
+        self.writer.close()
+
+    def discard(self):
+        self.num_frames = 0
+        self.writer.discard()
+
+def reduce_blocks(frames, mode : str, factor : int):
+    # frames is a (num_frames, payload_size) uint32 array, num_frames a multiple of factor. Returns the reduced frames as
+    # a (num_blocks, payload_size) array (two frames per block in envelope mode)
+    num_blocks = len(frames) // factor
+    blocks = frames.reshape(num_blocks, factor, frames.shape[1])
+    data = blocks[:, :, pf.HEADER_LENGTH:].view(np.int32)
+
+    if (mode == "decimate"):
+        reduced = [data[:, 0]]
+    elif (mode == "boxcar"):
+        reduced = [np.rint(data.mean(axis = 1)).astype(np.int32)]
+    elif (mode == "envelope"):
+        reduced = [data.min(axis = 1), data.max(axis = 1)]
+    else:
+        raise ValueError("Unknown decimation mode: " + str(mode))
+
+    output = np.empty((num_blocks, len(reduced), frames.shape[1]), dtype = np.uint32)
+    output[:, :, 0:pf.HEADER_LENGTH] = blocks[:, 0, None, 0:pf.HEADER_LENGTH]
+    output[:, :, 0] = np.bitwise_or.reduce(blocks[:, :, 0], axis = 1)[:, None]
+    for i in range(len(reduced)):
+        output[:, i, pf.HEADER_LENGTH:] = reduced[i].view(np.uint32)
+    return output.reshape(num_blocks * len(reduced), frames.shape[1])
+
+def wrap_writer(writer, mode : str = None, factor : int = 1):
+    # Returns the writer itself if no decimation is requested
+    if (mode == None):
+        return writer
+    return Decimator(writer, mode, factor)
@@ -14,6 +14,18 @@
 ##############################################################################################
 
 import csv as csv
+import os
+import json
+import time
+# Custom imports
+import packet_fields as pf
+import utils as utils
+
+DATA_DIRECTORY = "data"
+METADATA_FILENAME = "metadata.json"
+SEGMENT_FILENAME = "frames_{:04d}.dat"
+MAX_SEGMENT_SIZE = 256 * 1024 * 1024 # Bytes
+FORMAT_VERSION = 1
 
 
 def export_data_payloads_to_csv(data_packets : list):
@@ -21,6 +33,131 @@ def export_data_payloads_to_csv(data_packets : list):
     f = open("data/raw_data_1.csv", "w")
     writer = csv.writer(f)
     for p in data_packets:
-        writer.writerow(p.payload[43:])
+        writer.writerow(["{:x}".format(w) for w in p.payload[pf.HEADER_LENGTH:]])
     f.close()
 
+class Acquisition_writer():
+    # Streams the frames of an acquisition to disk as they are received. Each run is stored in its own directory:
+    #   - frames_XXXX.dat : Raw frame payloads (header + data) as little-endian uint32 words, one frame after the other.
+    #                       A new segment is started every time the current one reaches max_segment_size
+    #   - metadata.json   : Frame layout, segments and the parameters of the run. It is rewritten every time a segment
+    #                       is closed, so a crashed run can still be read up to the last closed segment
+    def __init__(self, run_name : str = None, directory : str = DATA_DIRECTORY, max_segment_size : int = MAX_SEGMENT_SIZE,
+                 metadata : dict = None):
+        if (run_name == None):
+            run_name = time.strftime("run_%Y%m%d_%H%M%S")
+        self.run_directory = create_run_directory(directory, run_name)
+        self.max_segment_size = max_segment_size
+        self.segment_file = None
+        self.segment_size = 0
+        self.frame_size = 0
+
+        self.metadata = {
+            "format_version"    : FORMAT_VERSION,
+            "run_name"          : os.path.basename(self.run_directory),
+            "start_time"        : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end_time"          : None,
+            "header_length"     : pf.HEADER_LENGTH,
+            "header_version"    : pf.HEADER_VERSION,
+            "word_dtype"        : "<u4",
+            "payload_size"      : None,
+            "num_rows"          : None,
+            "num_cols"          : None,
+            "frames"            : 0,
+            "segments"          : [],
+            "parameters"        : {}
+        }
+        if (metadata != None):
+            self.metadata.update(metadata)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_packet(self, packet : pf.Data_packet):
+        self.write_frame(packet.payload)
+
+    def write_frame(self, payload):
+        # payload can be a list of hex strings, a word array or the raw little-endian bytes of the frame
+        data = payload_to_bytes(payload)
+
+        if (self.frame_size == 0):
+            self.set_frame_layout(data)
+        elif (len(data) != self.frame_size):
+            raise ValueError("Frame size changed during the acquisition: " + str(len(data)) + " bytes, expected " +
+                             str(self.frame_size))
+
+        if (self.segment_file == None or self.segment_size + len(data) > self.max_segment_size):
+            self.rotate()
+
+        self.segment_file.write(data)
+        self.segment_size = self.segment_size + len(data)
+        self.metadata["segments"][-1]["frames"] += 1
+        self.metadata["frames"] += 1
+
+    def set_frame_layout(self, data):
+        words = utils.as_word_array(data)
+        num_rows = int(words[3]) # Number of rows reported
+        self.frame_size = len(data)
+        self.metadata["payload_size"] = len(words)
+        self.metadata["num_rows"] = num_rows
+        self.metadata["num_cols"] = (len(words) - pf.HEADER_LENGTH) // num_rows if num_rows > 0 else 0
+
+    def rotate(self):
+        self.close_segment()
+        filename = SEGMENT_FILENAME.format(len(self.metadata["segments"]))
+        self.segment_file = open(os.path.join(self.run_directory, filename), "wb")
+        self.segment_size = 0
+        self.metadata["segments"].append({"file" : filename, "frames" : 0})
+
+    def close_segment(self):
+        if (self.segment_file != None):
+            self.segment_file.close()
+            self.segment_file = None
+            self.write_metadata()
+
+    def flush(self):
+        if (self.segment_file != None):
+            self.segment_file.flush()
+        self.write_metadata()
+
+    def close(self):
+        self.metadata["end_time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.close_segment()
+        self.write_metadata()
+
+    def discard(self):
+        # Removes the run directory instead of closing it, e.g. when the card has not started the acquisition. Only the
+        # files written by the writer are removed
+        if (self.segment_file != None):
+            self.segment_file.close()
+            self.segment_file = None
+        for filename in [s["file"] for s in self.metadata["segments"]] + [METADATA_FILENAME]:
+            if (os.path.exists(os.path.join(self.run_directory, filename))):
+                os.remove(os.path.join(self.run_directory, filename))
+        os.rmdir(self.run_directory)
+
+    def write_metadata(self):
+        # Written to a temporary file first so the sidecar is never left half written
+        filename = os.path.join(self.run_directory, METADATA_FILENAME)
+        f = open(filename + ".tmp", "w")
+        json.dump(self.metadata, f, indent = 4)
+        f.close()
+        os.replace(filename + ".tmp", filename)
+
+def create_run_directory(directory, run_name):
+    # Previous runs are never overwritten, a suffix is added if the run directory already exists
+    run_directory = os.path.join(directory, run_name)
+    i = 1
+    while os.path.exists(run_directory):
+        run_directory = os.path.join(directory, run_name + "_" + str(i))
+        i = i + 1
+    os.makedirs(run_directory)
+    return run_directory
+
+def payload_to_bytes(payload):
+    if (isinstance(payload, (bytes, bytearray, memoryview))):
+        return bytes(payload)
+    return utils.as_word_array(payload).astype("<u4", copy = False).tobytes()
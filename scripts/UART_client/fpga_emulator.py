@@ -0,0 +1,353 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: fpga_emulator.py
+# Description: Software emulator of the channel card UART protocol (command_handler, packet_builder and frame_builder).
+#              It answers the RB/WB/GO/ST commands with the same replies as the card and streams the data frames
+#              during an acquisition, so the client can be tested and benchmarked without hardware.
+#              It can be run over a pty pair (POSIX only) or over a TCP socket:
+#
+#                  emulator = Fpga_emulator(frame_rate = 1000)
+#                  port_name = emulator.start_pty()        # or emulator.start_socket() -> "socket://localhost:XXXX"
+#                  card = channel_card.Channel_card(port_name)
+#
+#              or from the command line: python fpga_emulator.py [--socket PORT] [--rate FRAMES_PER_SECOND]
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import os
+import time
+import socket
+import select
+import argparse
+import threading
+import numpy as np
+# Custom imports
+import packet_fields as pf
+import utils as utils
+
+DEFAULT_FRAME_RATE = 1000 # Frames per second. None to send the frames as fast as possible
+SELECT_TIMEOUT = 0.05 # Seconds. Max time the threads wait before checking if the emulator has been stopped
+
+PREAMBLE_BYTES = np.array([int(pf.PREAMBLE_1, 16), int(pf.PREAMBLE_2, 16)], dtype = "<u4").tobytes()
+CMD_PACKET_SIZE = pf.CMD_PACKET_LENGTH * 4 # Bytes
+CARD_ID = int(pf.CARD_ID, 16)
+
+# Error codes of the command_handler
+ERROR_GO_WITH_NO_SETUP      = 1
+ERROR_INCORRECT_PARAM_ID    = 2
+ERROR_INCORRECT_PARAM_SIZE  = 3
+ERROR_ST_WITH_NO_ACQ        = 4
+
+# Default values of the parameters after reset (utils.pkg.vhdl)
+PARAM_DEFAULTS = {
+    pf.Param_id.ON_BIAS_ID          : [0xffffffff] * pf.MAX_ROWS,
+    pf.Param_id.ROW_LEN_ID          : [50],
+    pf.Param_id.NUM_ROWS_ID         : [pf.MAX_ROWS],
+    pf.Param_id.SAMPLE_DLY_ID       : [25],
+    pf.Param_id.SAMPLE_NUM_ID       : [15],
+    pf.Param_id.FB_DLY_ID           : [23],
+    pf.Param_id.GAIN_0_ID           : [0xffffffff] * pf.MAX_ROWS,
+    pf.Param_id.GAIN_1_ID           : [2] * pf.MAX_ROWS,
+    pf.Param_id.DATA_RATE_ID        : [2],
+    pf.Param_id.NUM_COLS_REP_ID     : [1],
+    pf.Param_id.CNV_LEN_ID          : [3],
+    pf.Param_id.SCK_DLY_ID          : [1],
+    pf.Param_id.SCK_HALF_PERIOD_ID  : [1],
+    pf.Param_id.SERVO_MODE_ID       : [3] * pf.MAX_CHANNELS,
+    pf.Param_id.DATA_MODE_ID        : [1],
+    pf.Param_id.FILTR_COEFF_ID      : [(-25246) & 0xffffffff, 11687, (-20991) & 0xffffffff, 6956, 4, 4]
+}
+
+class Fpga_emulator():
+    def __init__(self, frame_rate : float = DEFAULT_FRAME_RATE, reset_on_rs : bool = False):
+        # The card ignores the RS command. With reset_on_rs the parameters are reset to their defaults and an OK reply
+        # is sent instead
+        self.frame_rate = frame_rate
+        self.reset_on_rs = reset_on_rs
+        self.lock = threading.Lock() # Protects the state and the writes to the port
+        self.running = False
+        self.threads = []
+        self.read_fd = None
+        self.write_fd = None
+        self.connection = None
+        self.server = None
+        self.slave_fd = None
+        self.received = bytearray()
+        self.frames_sent = 0
+        self.reset()
+
+    def reset(self):
+        self.params = {param_id : list(PARAM_DEFAULTS.get(param_id, [0] * pf.PARAM_ID_TO_SIZE[param_id]))
+                       for param_id in pf.Param_id}
+        self.acquisition_configured = False
+        self.acquisition_on = False
+        self.stop_received = False
+        self.stop_param_id = int(pf.Param_id.RET_DATA_ID.value, 16)
+
+    # Transports
+
+    def start_pty(self):
+        # Returns the name of the port the client has to open
+        import tty # POSIX only
+        master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.read_fd = master_fd
+        self.write_fd = master_fd
+        self.start()
+        return os.ttyname(self.slave_fd)
+
+    def start_socket(self, port : int = 0, host : str = "localhost"):
+        # Returns the url of the port the client has to open. The first client that connects is served
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.start()
+        return "socket://" + host + ":" + str(self.server.getsockname()[1])
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target = self.command_loop, daemon = True),
+                        threading.Thread(target = self.data_loop, daemon = True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for fd in set([self.read_fd, self.slave_fd]):
+            if (fd != None):
+                os.close(fd)
+        if (self.connection != None):
+            self.connection.close()
+        if (self.server != None):
+            self.server.close()
+        self.read_fd = self.write_fd = self.slave_fd = self.connection = self.server = None
+
+    def read_bytes(self):
+        # Returns the received bytes, b"" if nothing has been received in SELECT_TIMEOUT
+        if (self.server != None and self.connection == None):
+            if (len(select.select([self.server], [], [], SELECT_TIMEOUT)[0]) == 0):
+                return b""
+            self.connection, address = self.server.accept()
+
+        source = self.connection if self.connection != None else self.read_fd
+        if (len(select.select([source], [], [], SELECT_TIMEOUT)[0]) == 0):
+            return b""
+        try:
+            data = self.connection.recv(65536) if self.connection != None else os.read(self.read_fd, 65536)
+        except OSError:
+            return b""
+        if (len(data) == 0 and self.connection != None):
+            # The client has disconnected, wait for the next one
+            self.connection.close()
+            self.connection = None
+        return data
+
+    def write_bytes(self, data : bytes):
+        if (self.connection != None):
+            self.connection.sendall(data)
+        elif (self.write_fd != None and self.server == None):
+            view = memoryview(data)
+            while len(view) > 0:
+                view = view[os.write(self.write_fd, view):]
+
+    # Commands
+
+    def command_loop(self):
+        while self.running:
+            data = self.read_bytes()
+            if (len(data) == 0):
+                continue
+            self.received.extend(data)
+            for words in self.get_cmd_packets():
+                # The reply is sent with the lock taken so the reply to GO always goes before the first frame
+                with self.lock:
+                    reply = self.process_command(words)
+                    if (reply is not None):
+                        self.write_bytes(reply.tobytes())
+
+    def get_cmd_packets(self):
+        # Yields the command packets (as uint32 arrays) in the received buffer. The packets parser of the card drops
+        # the bytes until a preamble is found
+        while True:
+            start = self.received.find(PREAMBLE_BYTES)
+            if (start < 0):
+                del self.received[:max(0, len(self.received) - len(PREAMBLE_BYTES) + 1)]
+                return
+            if (len(self.received) - start < CMD_PACKET_SIZE):
+                del self.received[:start]
+                return
+            words = np.frombuffer(bytes(self.received[start:start + CMD_PACKET_SIZE]), dtype = "<u4")
+            if (int(words[-1]) != utils.calculate_checksum_words(words[5:-1])):
+                # Wrong checksum, the packet is discarded and the search starts again after its preamble
+                del self.received[:start + len(PREAMBLE_BYTES)]
+                continue
+            del self.received[:start + CMD_PACKET_SIZE]
+            yield words
+
+    def process_command(self, words):
+        # Returns the reply words to the command, None if the card does not reply. Called with the lock taken
+        packet_type = pf.PACKET_TYPE_FROM_WORD.get(int(words[2]))
+        card_id = int(words[3]) >> 16
+        param_id = int(words[3]) & 0xffff
+        payload_size = int(words[4])
+        payload = [int(w) for w in words[5:5 + min(payload_size, pf.CMD_PAYLOAD_LENGTH)]]
+
+        if (card_id != CARD_ID):
+            return None
+
+        if (self.acquisition_on):
+            # While in acquisition all the packets that are not stop are ignored. The reply to the stop is sent
+            # after the last frame
+            if (packet_type == pf.Packet_type.CMD_ST and param_id == int(pf.Param_id.RET_DATA_ID.value, 16)):
+                self.stop_received = True
+                self.stop_param_id = param_id
+            return None
+
+        if (packet_type == pf.Packet_type.CMD_GO):
+            if (not self.acquisition_configured or param_id != int(pf.Param_id.RET_DATA_ID.value, 16)):
+                return build_reply(packet_type, param_id, ERROR_GO_WITH_NO_SETUP)
+            self.start_acquisition()
+            return build_reply(packet_type, param_id)
+        elif (packet_type == pf.Packet_type.CMD_ST):
+            return build_reply(packet_type, param_id, ERROR_ST_WITH_NO_ACQ)
+        elif (packet_type == pf.Packet_type.CMD_RS):
+            if (not self.reset_on_rs):
+                return None
+            self.reset()
+            return build_reply(packet_type, param_id)
+        elif (packet_type not in [pf.Packet_type.CMD_RB, pf.Packet_type.CMD_WB]):
+            return None
+
+        if (param_id not in pf.PARAM_ID_FROM_HALF_WORD):
+            return build_reply(packet_type, param_id, ERROR_INCORRECT_PARAM_ID)
+        param = pf.PARAM_ID_FROM_HALF_WORD[param_id]
+        if (packet_type == pf.Packet_type.CMD_RB):
+            return build_reply(packet_type, param_id, payload = self.params[param])
+
+        if (payload_size != pf.PARAM_ID_TO_SIZE[param]):
+            return build_reply(packet_type, param_id, ERROR_INCORRECT_PARAM_SIZE)
+        self.params[param] = payload
+        if (param == pf.Param_id.RET_DATA_S_ID):
+            self.acquisition_configured = True
+        return build_reply(packet_type, param_id)
+
+    # Data
+
+    def start_acquisition(self):
+        # The frame layout is taken from the parameters when the acquisition starts
+        self.acquisition_on = True
+        self.stop_received = False
+        self.frame_id = self.params[pf.Param_id.RET_DATA_S_ID][0]
+        self.final_id = self.params[pf.Param_id.RET_DATA_S_ID][1]
+        self.num_rows = max(1, min(self.params[pf.Param_id.NUM_ROWS_ID][0], pf.MAX_ROWS))
+        self.num_cols = min(self.params[pf.Param_id.NUM_COLS_REP_ID][0], pf.MAX_CHANNELS)
+        self.data_rate = max(1, self.params[pf.Param_id.DATA_RATE_ID][0])
+        self.total_frame_counter = 0
+        self.next_frame_time = time.perf_counter()
+
+    def data_loop(self):
+        while self.running:
+            with self.lock:
+                if (self.acquisition_on):
+                    self.send_data_frame()
+                    wait = 0 if self.frame_rate == None else self.next_frame_time - time.perf_counter()
+                else:
+                    wait = SELECT_TIMEOUT
+            if (wait > 0):
+                time.sleep(wait)
+
+    def send_data_frame(self):
+        # Called with the lock taken
+        last_frame = self.frame_id == self.final_id or self.stop_received
+        self.total_frame_counter = self.total_frame_counter + self.data_rate
+        frame = build_data_frame(self.get_header(last_frame), self.get_data())
+        self.write_bytes(frame.tobytes())
+        self.frames_sent = self.frames_sent + 1
+
+        if (last_frame):
+            self.acquisition_on = False
+            if (self.stop_received):
+                self.write_bytes(build_reply(pf.Packet_type.CMD_ST, self.stop_param_id).tobytes())
+            self.stop_received = False
+        else:
+            self.frame_id = (self.frame_id + 1) & 0xffffffff
+        if (self.frame_rate != None):
+            self.next_frame_time = self.next_frame_time + 1 / self.frame_rate
+
+    def get_header(self, last_frame : bool):
+        header = np.zeros(pf.HEADER_LENGTH, dtype = np.uint32)
+        header[0] = (pf.STATUS_STOP if self.stop_received else 0) | (pf.STATUS_LAST_FRAME if last_frame else 0)
+        header[1] = self.frame_id
+        header[2] = self.params[pf.Param_id.ROW_LEN_ID][0]
+        header[3] = self.num_rows
+        header[4] = self.data_rate
+        header[5] = self.total_frame_counter
+        header[6] = pf.HEADER_VERSION
+        header[9] = pf.MAX_ROWS
+        return header
+
+    def get_data(self):
+        # Each channel is a sine wave sampled once per row, with a different offset per row. Stored channel by channel
+        # as the frame_builder does (index = channel * num_rows + row)
+        sample = self.total_frame_counter * self.num_rows + np.arange(self.num_rows)
+        data = [np.round(1000 * np.sin(2 * np.pi * sample / (1000 * (channel + 1)))) + 100 * np.arange(self.num_rows)
+                for channel in range(self.num_cols)]
+        if (len(data) == 0):
+            return np.zeros(0, dtype = np.uint32)
+        return np.concatenate(data).astype(np.int32).view(np.uint32)
+
+def build_reply(packet_type : pf.Packet_type, param_id : int, error : int = None, payload : list = None):
+    # Successful non RB commands reply a single zero word, the errors reply the error code
+    if (error != None):
+        payload = [error]
+    elif (payload == None):
+        payload = [0]
+    cmd_type = int(packet_type.value, 16) & 0xffff
+    ok_err = int((pf.Ok_err.ER if error != None else pf.Ok_err.OK).value, 16)
+
+    body = np.array([(cmd_type << 16) | ok_err, (CARD_ID << 16) | param_id] + list(payload), dtype = np.uint32)
+    words = np.empty(len(body) + 5, dtype = "<u4")
+    words[0:4] = [int(pf.PREAMBLE_1, 16), int(pf.PREAMBLE_2, 16), int(pf.Packet_type.REPLY.value, 16), len(payload) + 3]
+    words[4:-1] = body
+    words[-1] = utils.calculate_checksum_words(body)
+    return words
+
+def build_data_frame(header, data):
+    words = np.empty(pf.PACKET_HEADER_LENGTH + len(header) + len(data) + 1, dtype = "<u4")
+    words[0:4] = [int(pf.PREAMBLE_1, 16), int(pf.PREAMBLE_2, 16), int(pf.Packet_type.DATA.value, 16),
+                  len(header) + len(data) + 1]
+    words[4:4 + len(header)] = header
+    words[4 + len(header):-1] = data
+    words[-1] = utils.calculate_checksum_words(words[4:-1])
+    return words
+
+def main():
+    parser = argparse.ArgumentParser(description = "Emulator of the MATESSE channel card UART protocol")
+    parser.add_argument("-s", "--socket", type = int, default = None, help = "Serve on this TCP port instead of a pty")
+    parser.add_argument("-r", "--rate", type = float, default = DEFAULT_FRAME_RATE, help = "Frames per second (0: no limit)")
+    parser.add_argument("--reset-on-rs", action = "store_true", help = "Reset the parameters and reply OK to RS")
+    args = parser.parse_args()
+
+    emulator = Fpga_emulator(args.rate if args.rate > 0 else None, args.reset_on_rs)
+    port_name = emulator.start_socket(args.socket) if args.socket != None else emulator.start_pty()
+    print("Emulator running on \"" + port_name + "\" (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+if __name__ == "__main__" :
+    main()
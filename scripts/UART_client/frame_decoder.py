@@ -0,0 +1,54 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: frame_decoder.py
+# Description: Decodes batches of data frames into NumPy structured arrays (see packet_fields.get_frame_dtype), so the
+#              header fields can be accessed by name and the data can be processed for all the frames at once
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import numpy as np
+# Custom imports
+import packet_fields as pf
+import utils as utils
+
+def decode_frames(raw, num_rows : int, num_cols : int):
+    # raw holds consecutive frame payloads (header + data, without preamble, type, size or checksum) as little-endian
+    # words: bytes, bytearray, memoryview, mmap or a contiguous uint32 array. The returned array is a view of raw, no
+    # data is copied
+    return np.frombuffer(raw, dtype = pf.get_frame_dtype(num_rows, num_cols))
+
+def get_num_cols(payload_size : int, num_rows : int):
+    return (payload_size - pf.HEADER_LENGTH) // num_rows
+
+def get_header_word(payload, index : int):
+    # Header word of a single frame payload, either a list of hex strings or of ints
+    return int(payload[index], 16) if isinstance(payload[index], str) else int(payload[index])
+
+def get_frame_id(payload):
+    return get_header_word(payload, 1)
+
+def is_last_frame(payload):
+    return (get_header_word(payload, 0) & pf.STATUS_LAST_FRAME) != 0
+
+def get_frame_shape(payload):
+    # Returns (num_rows, num_cols) from the payload of a single frame
+    num_rows = get_header_word(payload, 3)
+    return num_rows, get_num_cols(len(payload), num_rows)
+
+def payloads_to_array(data_packets : list):
+    # Builds a (frames, payload_size) uint32 array from a list of Data_packet
+    return np.stack([utils.as_word_array(p.payload) for p in data_packets])
+
+def decode_data_packets(data_packets : list):
+    if (len(data_packets) == 0):
+        return np.zeros(0, dtype = pf.DATA_HEADER_DTYPE)
+    num_rows, num_cols = get_frame_shape(data_packets[0].payload)
+    return decode_frames(payloads_to_array(data_packets), num_rows, num_cols)
@@ -0,0 +1,165 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: live_monitor.py
+# Description: Live plot of the data frames while they are being acquired. The acquisition thread only copies each frame
+#              into a fixed size ring buffer (one trace per row and channel), the plot is redrawn from it in the main
+#              thread at a capped refresh rate using matplotlib blitting, so plotting never slows down the reception
+#
+# Dependencies: matplotlib
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import time
+import threading
+import numpy as np
+# Custom imports
+import packet_fields as pf
+import frame_decoder as fd
+import utils as utils
+
+DEFAULT_LENGTH = 2000 # Frames shown in the plot
+DEFAULT_MAX_FPS = 20 # Max refresh rate of the plot
+
+class Frame_ring_buffer():
+    # Last length values of each row and channel, stored as [channel, row, frame]. The shape is taken from the first
+    # frame written
+    def __init__(self, length : int = DEFAULT_LENGTH):
+        self.length = length
+        self.lock = threading.Lock()
+        self.data = None
+        self.num_frames = 0 # Total frames written
+        self.skipped_frames = 0 # Frames without rows in their header, they cannot be shaped
+        self.last_frame_id = None
+
+    def write_packet(self, packet : pf.Data_packet):
+        self.write_payload(packet.payload)
+
+    def write_payload(self, payload):
+        words = utils.as_word_array(payload)
+        if (fd.get_header_word(words, 3) == 0):
+            # Same as exporter.set_frame_layout, a frame without rows has no layout. It is skipped instead of stopping the
+            # acquisition thread
+            self.skipped_frames = self.skipped_frames + 1
+            return
+        num_rows, num_cols = fd.get_frame_shape(words)
+        values = words[pf.HEADER_LENGTH:pf.HEADER_LENGTH + num_rows * num_cols].view(np.int32).reshape(num_cols, num_rows)
+        with self.lock:
+            if (self.data is None or self.data.shape[0:2] != values.shape):
+                self.data = np.zeros((num_cols, num_rows, self.length), dtype = np.int32)
+                self.num_frames = 0
+            self.data[:, :, self.num_frames % self.length] = values
+            self.num_frames = self.num_frames + 1
+            self.last_frame_id = fd.get_frame_id(words)
+
+    def get_data(self):
+        # Returns a copy of the stored values in time order (oldest first) and the total number of frames written
+        with self.lock:
+            if (self.data is None):
+                return None, 0
+            if (self.num_frames < self.length):
+                return self.data[:, :, 0:self.num_frames].copy(), self.num_frames
+            start = self.num_frames % self.length
+            return np.concatenate((self.data[:, :, start:], self.data[:, :, 0:start]), axis = 2), self.num_frames
+
+class Live_monitor():
+    # write_packet can be called from any thread. run() must be called from the main thread, it returns when the plot
+    # window is closed or stop() is called
+    def __init__(self, length : int = DEFAULT_LENGTH, max_fps : float = DEFAULT_MAX_FPS, rows : list = None,
+                 title : str = "Live monitor"):
+        self.buffer = Frame_ring_buffer(length)
+        self.max_fps = max_fps
+        self.rows = rows # Rows to plot (all of them if None)
+        self.title = title
+        self.running = False
+
+    def write_packet(self, packet : pf.Data_packet):
+        self.buffer.write_packet(packet)
+
+    def flush(self):
+        pass
+
+    def stop(self):
+        self.running = False
+
+    def stop_when_finished(self, thread : threading.Thread):
+        # Stops the monitor once thread (e.g. the acquisition) has finished
+        def wait_thread():
+            thread.join()
+            self.stop()
+        threading.Thread(target = wait_thread, daemon = True).start()
+
+    def run(self):
+        import matplotlib.pyplot as plt # Optional dependency, only needed for the live monitor
+
+        # The figure is created with the first frame, when the number of channels and rows is known
+        self.running = True
+        data, num_frames = self.buffer.get_data()
+        while self.running and data is None:
+            time.sleep(1 / self.max_fps)
+            data, num_frames = self.buffer.get_data()
+        if (not self.running):
+            return
+
+        num_cols, num_rows = data.shape[0], data.shape[1]
+        rows = self.rows if self.rows != None else range(num_rows)
+        fig, axes = plt.subplots(max(1, num_cols), 1, sharex = True, squeeze = False)
+        fig.canvas.manager.set_window_title(self.title)
+        fig.canvas.mpl_connect("close_event", lambda event: self.stop())
+        lines = []
+        x = np.arange(self.buffer.length)
+        for channel in range(num_cols):
+            ax = axes[channel][0]
+            ax.set_ylabel("Channel " + str(channel))
+            ax.set_xlim(0, self.buffer.length - 1)
+            for row in rows:
+                line, = ax.plot(x, np.zeros(self.buffer.length), label = "Row " + str(row), animated = True)
+                lines.append((channel, row, line))
+            ax.legend(loc = "upper left", fontsize = "x-small", ncol = 4)
+        axes[-1][0].set_xlabel("Frame")
+        plt.show(block = False)
+        plt.pause(0.1)
+
+        background = None
+        limits = None
+        last_drawn = -1
+        while self.running:
+            frame_start = time.perf_counter()
+            data, num_frames = self.buffer.get_data()
+            if (num_frames != last_drawn and data is not None and data.shape[2] > 0):
+                last_drawn = num_frames
+                # The axes (the static part of the plot) are only redrawn when the data does not fit in them anymore or
+                # it only uses a small part of them
+                ranges = [(int(data[c].min()), int(data[c].max())) for c in range(num_cols)]
+                if (background == None or needs_rescale(ranges, limits)):
+                    limits = []
+                    for c in range(num_cols):
+                        margin = max(1, (ranges[c][1] - ranges[c][0]) * 0.1)
+                        limits.append((ranges[c][0] - margin, ranges[c][1] + margin))
+                        axes[c][0].set_ylim(limits[c][0], limits[c][1])
+                    fig.canvas.draw()
+                    background = fig.canvas.copy_from_bbox(fig.bbox)
+
+                fig.canvas.restore_region(background)
+                for channel, row, line in lines:
+                    line.set_data(x[0:data.shape[2]], data[channel, row])
+                    axes[channel][0].draw_artist(line)
+                fig.canvas.blit(fig.bbox)
+            fig.canvas.flush_events()
+
+            # Refresh rate cap
+            wait = 1 / self.max_fps - (time.perf_counter() - frame_start)
+            if (wait > 0):
+                time.sleep(wait)
+        plt.close(fig)
+
+def needs_rescale(ranges : list, limits : list):
+    for (low, high), (limit_low, limit_high) in zip(ranges, limits):
+        if (low < limit_low or high > limit_high or (high - low) < (limit_high - limit_low) / 4):
+            return True
+    return False
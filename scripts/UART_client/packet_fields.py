@@ -14,6 +14,7 @@
 ##############################################################################################
 
 from enum import Enum
+import numpy as np
 
 PREAMBLE_1 = "a5a5a5a5"
 PREAMBLE_2 = "5a5a5a5a"
@@ -21,6 +22,48 @@ PREAMBLE_2 = "5a5a5a5a"
 CARD_ID = "ffff"
 HEADER_LENGTH = 43
 
+MAX_ROWS = 12
+MAX_CHANNELS = 2
+MAX_PAYLOAD = HEADER_LENGTH + MAX_ROWS * MAX_CHANNELS # Max payload that any data packet will have
+MAX_REPLY_PAYLOAD = 58
+CMD_PAYLOAD_LENGTH = 58 # Commands are always sent with a fixed payload length
+CMD_PACKET_LENGTH = 5 + CMD_PAYLOAD_LENGTH + 1 # preamble (2) + type + id + size + payload + checksum
+PACKET_HEADER_LENGTH = 4 # preamble (2) + type + size. Enough to know the total length of a reply or data packet
+
+# Data frame header (frame_builder HEADER_VERSION 7). Every field is a 32 bit word
+HEADER_VERSION = 7
+DATA_HEADER_DTYPE = np.dtype([
+    ("status",              "<u4"), # (0) bit 0: last frame, bit 1: stop received
+    ("frame_id",            "<u4"), # (1)
+    ("row_len",             "<u4"), # (2)
+    ("num_rows_rep",        "<u4"), # (3) Number of rows reported in the frame
+    ("data_rate",           "<u4"), # (4)
+    ("total_frame_counter", "<u4"), # (5)
+    ("header_version",      "<u4"), # (6)
+    ("ramp_value",          "<u4"), # (7)
+    ("ramp_addr",           "<u4"), # (8)
+    ("num_rows",            "<u4"), # (9) Max rows of the card
+    ("sync_box_num",        "<u4"), # (10)
+    ("run_id",              "<u4"), # (11)
+    ("user_word",           "<u4"), # (12)
+    ("errno_0",             "<u4"), # (13)
+    ("fpga_temp",           "<u4", (9,)), # (14-22) AC, BC1, BC2, BC3, RC1, RC2, RC3, RC4, CC
+    ("errno_1",             "<u4"), # (23)
+    ("card_temp",           "<u4", (9,)), # (24-32) AC, BC1, BC2, BC3, RC1, RC2, RC3, RC4, CC
+    ("errno_2",             "<u4"), # (33)
+    ("reserved",            "<u4", (7,)), # (34-40)
+    ("errno_3",             "<u4"), # (41)
+    ("box_temp",            "<u4")  # (42)
+])
+
+STATUS_LAST_FRAME = 0x1
+STATUS_STOP = 0x2
+
+def get_frame_dtype(num_rows : int, num_cols : int):
+    # Header fields followed by the data block. The frame_builder stores the data channel by channel
+    # (index = channel * num_rows + row), so the block is indexed as data[channel][row]
+    return np.dtype(DATA_HEADER_DTYPE.descr + [("data", "<i4", (num_cols, num_rows))])
+
 
 class Packet_type(Enum):
     CMD_RB = "20205242"
@@ -143,10 +186,36 @@ PARAM_ID_TO_SIZE = {
     Param_id.SCK_HALF_PERIOD_ID : 1
 }
 
+# Lookup tables from the received values to the fields, built once at import so decoding a field is a single lookup.
+# The packet type is a full word, the cmd type and OK/ER are the high and low half words of the reply word 4 and the
+# param id the low half word of the reply word 5
+PACKET_TYPE_FROM_WORD = {int(t.value, 16) : t for t in Packet_type}
+CMD_TYPE_FROM_HALF_WORD = {int(t.value, 16) : t for t in Cmd_type}
+OK_ERR_FROM_HALF_WORD = {int(e.value, 16) : e for e in Ok_err}
+PARAM_ID_FROM_HALF_WORD = {int(p.value, 16) : p for p in Param_id}
+CMD_PACKET_TYPES = frozenset([Packet_type.CMD_RB, Packet_type.CMD_WB, Packet_type.CMD_GO, Packet_type.CMD_ST,
+                              Packet_type.CMD_RS])
+# Cmd type of the reply to each command (the low half word of the command packet type)
+CMD_TYPE_FROM_PACKET_TYPE = {t : CMD_TYPE_FROM_HALF_WORD[int(t.value, 16) & 0xFFFF] for t in CMD_PACKET_TYPES}
+
+# Words counted by the size field that are not part of the payload (reply: cmd/err word, id word and checksum. data:
+# checksum). The size of the cmd packets is the payload size
+PAYLOAD_SIZE_OFFSET = {packet_type : 0 for packet_type in CMD_PACKET_TYPES}
+PAYLOAD_SIZE_OFFSET[Packet_type.REPLY] = 3
+PAYLOAD_SIZE_OFFSET[Packet_type.DATA] = 1
+
+PREAMBLE = (PREAMBLE_1, PREAMBLE_2) # Shared by all the parsed packets
+EMPTY_PAYLOAD = np.zeros(0, dtype = np.uint32)
+EMPTY_PAYLOAD.flags.writeable = False # Shared default, must never be modified
+
+# The packets use __slots__ (no per instance __dict__) as one object is created for every received frame. The payload of
+# the parsed packets is a uint32 NumPy view of the received words, it is never converted to strings
 class Packet():
+    __slots__ = ("total_words", "preamble", "packet_type")
+
     def __init__(self, 
                     total_words : int = 0, 
-                    preamble    : list = [], 
+                    preamble    : tuple = PREAMBLE, 
                     packet_type : Packet_type = None):
 
         self.total_words = total_words
@@ -154,15 +223,17 @@ class Packet():
         self.packet_type = packet_type
 
 class CMD_packet(Packet):
+    __slots__ = ("card_id", "param_id", "payload_size", "payload", "checksum")
+
     def __init__(self, 
                     total_words     : int = 0, 
-                    preamble        : list = [], 
+                    preamble        : tuple = PREAMBLE, 
                     packet_type     : Packet_type = None, 
                     card_id         : str = CARD_ID, 
                     param_id        : Param_id = None , 
                     payload_size    : int = 0, 
-                    payload         : list = [], 
-                    checksum        : str = []):
+                    payload         : np.ndarray = EMPTY_PAYLOAD, 
+                    checksum        : int = 0):
 
         Packet.__init__(self, total_words, preamble, packet_type)
         self.card_id = card_id
@@ -172,17 +243,19 @@ class CMD_packet(Packet):
         self.checksum = checksum
 
 class Reply_packet(Packet):
+    __slots__ = ("payload_size", "cmd_type", "err_ok", "card_id", "param_id", "payload", "checksum")
+
     def __init__(self, 
                     total_words     : int = 0, 
-                    preamble        : list = [], 
+                    preamble        : tuple = PREAMBLE, 
                     packet_type     : Packet_type = None, 
                     payload_size    : int = 0, 
                     cmd_type        : Packet_type = None, 
                     err_ok          : Ok_err = None, 
                     card_id         : str = CARD_ID, 
-                    param_id        : str = '', 
-                    payload         : list = [], 
-                    checksum        : str = ''):
+                    param_id        : Param_id = None, 
+                    payload         : np.ndarray = EMPTY_PAYLOAD, 
+                    checksum        : int = 0):
 
         Packet.__init__(self, total_words, preamble, packet_type)
         self.payload_size = payload_size
@@ -194,15 +267,17 @@ class Reply_packet(Packet):
         self.checksum = checksum
 
 class Data_packet(Packet):
+    __slots__ = ("payload_size", "payload", "checksum")
+
     def __init__(self, 
                     total_words     : int = 0, 
-                    preamble        : list = [], 
+                    preamble        : tuple = PREAMBLE, 
                     packet_type     : Packet_type = None, 
                     payload_size    : int = 0, 
-                    payload         : list = [], 
-                    checksum        : str = ''):
+                    payload         : np.ndarray = EMPTY_PAYLOAD, 
+                    checksum        : int = 0):
 
         Packet.__init__(self, total_words, preamble, packet_type)
         self.payload_size = payload_size
         self.payload = payload
-        self.checksum = checksum
\ No newline at end of file
+        self.checksum = checksum
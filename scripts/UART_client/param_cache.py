@@ -0,0 +1,86 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: param_cache.py
+# Description: Local mirror of the parameters of the card (PARAMS_LIST, PARAM_ID_TO_SIZE words each), so the
+#              configuration can be inspected without a round trip per lookup:
+#                  - read  : served from the cache, the card is only asked if the value is not known or refresh is set
+#                  - write : always sent to the card, the cache is updated once the card replies OK
+#                  - sync_all : reads all the parameters with a single write (see sender.Command_batch)
+#              The cache assumes this client is the only one changing the parameters of the card
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import logging
+# Custom imports
+import packet_fields as pf
+import serial_port as sp
+import sender as sender
+
+logger = logging.getLogger(__name__)
+
+class Param_cache():
+    def __init__(self, port : sp.Serial_port = sp.default_port, timeout : float = sp.TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+        self.values = {} # Param id -> list of ints (only the params whose value is known)
+
+    def __contains__(self, param_id : pf.Param_id):
+        return param_id in self.values
+
+    def read(self, param_id : pf.Param_id, refresh : bool = False):
+        # Returns the value of the param as a list of ints, None if it could not be read from the card
+        if (refresh or param_id not in self.values):
+            self.update(param_id, sender.read_param(param_id, self.timeout, self.port))
+        return self.values.get(param_id)
+
+    def write(self, param_id : pf.Param_id, values : list):
+        # Returns the reply to the WB command (None if it was not received)
+        reply_packet = sender.write_param(param_id, values, self.timeout, self.port)
+        if (reply_packet != None and reply_packet.err_ok == pf.Ok_err.OK):
+            # Stored as the card returns them (uint32), negative values are sent in two's complement
+            self.values[param_id] = [int(v) & 0xFFFFFFFF for v in values]
+        else:
+            # Without an OK the value on the card is unknown (the write may have happened if only the reply was lost)
+            self.values.pop(param_id, None)
+        return reply_packet
+
+    def sync_all(self, param_ids : list = pf.PARAMS_LIST):
+        # Reads all the params from the card with a single write. Returns the params that could not be read. self.timeout
+        # is extended by the wire time of the batch (see sender.Command_batch.send)
+        batch = sender.Command_batch(self.port)
+        for param_id in param_ids:
+            batch.add_read(param_id)
+        failed = []
+        for param_id, reply_packet in zip(param_ids, batch.send(self.timeout)):
+            if (not self.update(param_id, reply_packet)):
+                failed.append(param_id)
+        if (len(failed) > 0):
+            logger.warning("Could not read %s", ", ".join(p.name for p in failed))
+        return failed
+
+    def update(self, param_id : pf.Param_id, reply_packet):
+        # Stores the value of a RB reply. Returns False if the reply is missing or not OK
+        if (reply_packet == None or reply_packet.err_ok != pf.Ok_err.OK):
+            self.values.pop(param_id, None)
+            return False
+        self.values[param_id] = [int(w) for w in reply_packet.payload[0:pf.PARAM_ID_TO_SIZE[param_id]]]
+        return True
+
+    def invalidate(self, param_id : pf.Param_id = None):
+        # Forgets the value of the param (of all of them if None), e.g. after the card has been reset
+        if (param_id == None):
+            self.values = {}
+        else:
+            self.values.pop(param_id, None)
+
+    def get_snapshot(self):
+        # Known values by param name, in PARAMS_LIST order
+        return {param_id.name : self.values[param_id] for param_id in pf.PARAMS_LIST if param_id in self.values}
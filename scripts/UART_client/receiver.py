@@ -14,210 +14,286 @@
 ##############################################################################################
 
 import time
+import logging
+import numpy as np
 # Custom imports
 import serial_port as sp
 import packet_fields as pf
 import utils as utils
 
-def wait_data():
-    time.sleep(0.000001)
-    p = sp.read_data()
+logger = logging.getLogger(__name__)
+
+PREAMBLE_1_WORD = int(pf.PREAMBLE_1, 16)
+PREAMBLE_2_WORD = int(pf.PREAMBLE_2, 16)
+PREAMBLE_BYTES = sp.words_to_bytes([PREAMBLE_1_WORD, PREAMBLE_2_WORD])
+REPLY_TYPE_WORD = int(pf.Packet_type.REPLY.value, 16)
+DATA_TYPE_WORD = int(pf.Packet_type.DATA.value, 16)
+CMD_TYPE_WORDS = frozenset([int(t.value, 16) for t in pf.CMD_PACKET_TYPES])
+
+
+def wait_data(timeout = sp.TIMEOUT):
+    # Blocks until the port stays idle for timeout seconds. The data is buffered by the serial reader thread
+    p = sp.read_data(timeout)
     if (len(p) != 0):
         return True, p
-    print("[ERROR] Wait packet timeout")
+    logger.error("Wait packet timeout")
     return False, []
 
 
-def parse_packet(p : list):
+def parse_packet(p, check : bool = True):
+    # p holds the words of the packet as a uint32 array, raw little-endian bytes or a list of ints (or of hex strings, as
+    # returned by serial_port.read_data). The payload of the packet is a view of p when it is an array or bytes. check
+    # can be disabled when the checksum has already been verified (e.g. by the Stream_parser on the raw data)
+    p = utils.as_word_array(p)
     packet = pf.Packet()
 
-    if (p[0] != pf.PREAMBLE_1):
-        print("Preamble_1: NOT OK: 0x" + p[0])
+    if (len(p) < pf.PACKET_HEADER_LENGTH):
+        logger.warning("Packet too short: %d words", len(p))
+        return False, packet
+
+    if (p[0] != PREAMBLE_1_WORD):
+        logger.warning("Preamble_1: NOT OK: 0x%08x", p[0])
         return False, packet
     else:
-        packet.preamble.append(p[0])
-        print("\nPreamble_1: OK")
+        logger.debug("Preamble_1: OK")
 
-    if (p[1] != pf.PREAMBLE_2):
-        print("Preamble_2: NOT OK: 0x" + p[1])
+    if (p[1] != PREAMBLE_2_WORD):
+        logger.warning("Preamble_2: NOT OK: 0x%08x", p[1])
         return False, packet
     else:
-        packet.preamble.append(p[1])
-        print("Preamble_2: OK")
-
-    match p[2]:
-        case pf.Packet_type.CMD_RB.value:
-            print("Packet Type: CMD_RB")
-            packet_type = pf.Packet_type.CMD_RB
-            analyse_cmd_packet(p)
-        case pf.Packet_type.CMD_WB.value:
-            print("Packet Type: CMD_WB")
-            packet_type = pf.Packet_type.CMD_WB
-            analyse_cmd_packet(p)
-        case pf.Packet_type.CMD_GO.value:
-            print("Packet Type: CMD_GO")
-            packet_type = pf.Packet_type.CMD_GO
-            analyse_cmd_packet(p)
-        case pf.Packet_type.CMD_ST.value:
-            print("Packet Type: CMD_ST")
-            packet_type = pf.Packet_type.CMD_ST
-            analyse_cmd_packet(p)
-        case pf.Packet_type.CMD_RS.value:
-            print("Packet Type: CMD_RS")
-            packet_type = pf.Packet_type.CMD_RS
-            analyse_cmd_packet(p)
-        case pf.Packet_type.REPLY.value:
-            packet_type = pf.Packet_type.REPLY
-            print("Packet Type: Reply")
-            return parse_reply_packet(p, pf.Reply_packet(packet))
-        case pf.Packet_type.DATA.value:
-            packet_type = pf.Packet_type.DATA
-            print("Packet Type: DATA")
-            return parse_data_packet(p, pf.Data_packet(packet))
-        case _:
-            print("Packet Type: NOT OK" + p[2])
-            return False, packet
+        logger.debug("Preamble_2: OK")
+
+    packet_type = pf.PACKET_TYPE_FROM_WORD.get(int(p[2]))
+    if (packet_type == None):
+        logger.warning("Packet Type: NOT OK %08x", p[2])
+        return False, packet
+    logger.debug("Packet Type: %s", packet_type.name)
+
+    if (packet_type == pf.Packet_type.REPLY):
+        return parse_reply_packet(p, pf.Reply_packet(packet_type = packet_type), check)
+    if (packet_type == pf.Packet_type.DATA):
+        return parse_data_packet(p, pf.Data_packet(packet_type = packet_type), check)
+    # Commands are only analysed, they are not expected from the card
+    analyse_cmd_packet(p)
     return False, packet
 
 def analyse_cmd_packet(p):
     get_id(p[3])
     n = get_payload_size(p[4], pf.Packet_type.CMD_GO)
-    payload = p[5:62] # Cmd has a fixed size of 58 words of the payload
+    payload = p[5:5 + pf.CMD_PAYLOAD_LENGTH] # Cmd has a fixed size of 58 words of the payload
     print_payload(payload)
-    check_checksum(p[63], payload)
+    check_checksum(p[5 + pf.CMD_PAYLOAD_LENGTH], payload)
 
-def parse_reply_packet(p : list, packet : pf.Reply_packet):
+def parse_reply_packet(p : list, packet : pf.Reply_packet, check : bool = True):
     n = get_payload_size(p[3], pf.Packet_type.REPLY)
     packet.payload_size = n
     packet.cmd_type, packet.err_ok = get_type_and_error(p[4])
+    if (packet.cmd_type == None or packet.err_ok == None):
+        return False, packet
     packet.card_id, packet.param_id = get_id(p[5])
     packet.payload = p[6:6+n]
     print_payload(packet.payload)
-    checksum = p[6+n]
-    if(check_checksum(checksum, p[4:6+n]) == False):
+    packet.checksum = int(p[6+n])
+    if(check and check_checksum(packet.checksum, p[4:6+n]) == False):
         return False, packet
     packet.total_words = 6 + n + 1
     return True, packet
 
-def parse_data_packet(p : list, packet : pf.Data_packet):
+def parse_data_packet(p : list, packet : pf.Data_packet, check : bool = True):
     n = get_payload_size(p[3], pf.Packet_type.DATA)
     packet.payload_size = n
-    packet.payload = p[4:4+n] 
+    packet.payload = p[4:4+n]
     print_payload(packet.payload)
-    packet.checksum = p[4+n]
-    if (check_checksum(packet.checksum, packet.payload) == False):
+    packet.checksum = int(p[4+n])
+    if (check and check_checksum(packet.checksum, packet.payload) == False):
         return False, packet
     packet.total_words = 4 + n + 1
     return True, packet
 
 def get_id(word):
-    card_id = word[0:4]
-    param_id = word[4:8]
-    print("Card ID: " + card_id)
-    print("Param ID: " + param_id)
+    # Returns the card id as a 4 digit hex string and the Param_id (the raw int if it is not a known param id)
+    word = int(word, 16) if isinstance(word, str) else int(word)
+    card_id = "{:04x}".format(word >> 16)
+    param_id = pf.PARAM_ID_FROM_HALF_WORD.get(word & 0xFFFF, word & 0xFFFF)
+    logger.debug("Card ID: %s", card_id)
+    logger.debug("Param ID: %s", param_id)
     return card_id, param_id
 
 def get_type_and_error(word):
-    cmd_type_rx = word[0:4]
-    err_rx = word[4:8]
-    cmd_type = None
-    err = None
-    match cmd_type_rx:
-        case pf.Cmd_type.RB.value:
-            print("Cmd Type: CMD_RB")
-            cmd_type = pf.Cmd_type.RB
-        case pf.Cmd_type.WB.value:
-            print("Cmd Type: CMD_WB")
-            cmd_type = pf.Cmd_type.WB
-        case pf.Cmd_type.GO.value:
-            print("Cmd Type: CMD_GO")
-            cmd_type = pf.Cmd_type.GO
-        case pf.Cmd_type.ST.value:
-            print("Cmd Type: CMD_ST")
-            cmd_type = pf.Cmd_type.ST
-        case pf.Cmd_type.RS.value:
-            print("Cmd Type: CMD_RS")
-            cmd_type = pf.Cmd_type.RS
-        case _:
-            print("Cmd Type: NOT OK")
-            print(cmd_type_rx)
-            return False
+    # Returns the cmd type and the OK/ER of a reply, None for the fields that are not valid
+    word = int(word, 16) if isinstance(word, str) else int(word)
+    cmd_type = pf.CMD_TYPE_FROM_HALF_WORD.get(word >> 16)
+    err = pf.OK_ERR_FROM_HALF_WORD.get(word & 0xFFFF)
 
-    match err_rx:
-        case pf.Ok_err.OK.value:
-            err = pf.Ok_err.OK
-            print("Error/OK: OK")
-        case pf.Ok_err.ER.value:
-            err = pf.Ok_err.ER
-            print("Error/OK: ER")
-        case _:
-            print("Error/OK: NOT OK")
-            print(err_rx)
+    if (cmd_type == None):
+        logger.warning("Cmd Type: NOT OK %04x", word >> 16)
+    else:
+        logger.debug("Cmd Type: CMD_%s", cmd_type.name)
+
+    if (err == None):
+        logger.warning("Error/OK: NOT OK %04x", word & 0xFFFF)
+    else:
+        logger.debug("Error/OK: %s", err.name)
 
     return cmd_type, err
 
 def get_payload_size(word, p_type):
-    if (p_type == pf.Packet_type.CMD_RB or p_type == pf.Packet_type.CMD_WB or p_type == pf.Packet_type.CMD_GO or 
-        p_type == pf.Packet_type.CMD_ST or p_type == pf.Packet_type.CMD_RS):
-        s = int(word, 16)
-        print("Payload size: ", s)
-        return s
-    elif (p_type == pf.Packet_type.REPLY):
-        s = int(word, 16) - 3 
-        print("Payload size: ", s)
-        return s
-    elif (p_type == pf.Packet_type.DATA):
-        s = int(word, 16) - 1
-        print("Payload size: ", s)
-        return s
-    else:
-        print("Error wrong type when getting payload")
+    word = int(word, 16) if isinstance(word, str) else int(word)
+    offset = pf.PAYLOAD_SIZE_OFFSET.get(p_type)
+    if (offset == None):
+        logger.warning("Error wrong type when getting payload")
         return -1
+    s = word - offset
+    logger.debug("Payload size: %d", s)
+    return s
 
 def print_payload(words):
-    print("Payload : 0x" + ", 0x".join(words))
+    # The join is only done when the diagnostics are enabled, it is too expensive for every data frame
+    if (logger.isEnabledFor(logging.DEBUG)):
+        logger.debug("Payload : 0x%s", ", 0x".join([w if isinstance(w, str) else sp.format_word(w) for w in words]))
 
 def check_checksum(checksum, content):
+    # Binary path: checksum is an int and content the words as raw bytes or a word array
+    if (not isinstance(checksum, str)):
+        calculated_checksum = utils.calculate_checksum_words(content)
+        if (calculated_checksum != checksum):
+            logger.warning("Checksum doesn't match, calculated: %08x Received: %08x", calculated_checksum, checksum)
+            return False
+        logger.debug("Checksum OK")
+        return True
+
     calculated_checksum = utils.calculate_checksum(content)
-    print("Calculated checksum: ", calculated_checksum)
+    logger.debug("Calculated checksum: %s", calculated_checksum)
     if (int(calculated_checksum, 16) != int(checksum, 16)):
-        print("Checksum doesn't match, calculated: ", calculated_checksum, " Received: ", checksum)
+        logger.warning("Checksum doesn't match, calculated: %s Received: %s", calculated_checksum, checksum)
         return False
     else:
-        print("Checksum OK")
+        logger.debug("Checksum OK")
         return True
 
 def parse_data_words(words : list):
-    try:
-        data_packets = []
-        no_errors = True
-        e = 0
-        while len(words) > 0:
-            result, received_packet = parse_packet(words)
-            if (result == False):
-                e = e + 1
-                no_errors = False
-                print("-------------------------")
-                print("ERROR FOUND, leftover words:", len(words))
-                index = search_next_packet(words)
-                if (index == -1):
-                    print("No more packets, leftover words:", len(words))
-                    break
-                words = words[index]
-            else:
-                data_packets.append(received_packet)
-                words = words[received_packet.total_words:]
-    except IndexError as e:
-        print("Current leftover words:", len(words))
-        print(e)
-        no_errors = False
-    finally:
-        print("Errors:", e)
-        return no_errors, data_packets
-
-def search_next_packet(words : list):
-    words = words[1:]
-    for i in range(len(words) - 1):
-        if (words[i] == pf.PREAMBLE_1):
-            return i
-    return -1
\ No newline at end of file
+    parser = Stream_parser()
+    parser.feed(words)
+    data_packets = list(parser.packets())
+    leftover_words = parser.pending_words()
+    if (leftover_words > 0):
+        logger.warning("Incomplete packet, leftover words: %d", leftover_words)
+    logger.info("Errors: %d, dropped bytes: %d", parser.errors, parser.dropped_bytes)
+    return parser.errors == 0 and leftover_words == 0, data_packets
+
+def receive_packets(timeout = sp.TIMEOUT, parser = None, port = sp.default_port, poll_period : float = None):
+    # Yields the packets as soon as they are received, until the port stays idle for timeout seconds. With poll_period,
+    # None is also yielded every poll_period seconds without data, so the caller can act while the port is idle
+    if (parser == None):
+        parser = Stream_parser()
+    read_timeout = timeout if poll_period == None else min(poll_period, timeout)
+    last_data_time = time.perf_counter()
+    while True:
+        data = port.read_available_bytes(read_timeout)
+        if (len(data) == 0):
+            if (time.perf_counter() - last_data_time >= timeout):
+                return
+            yield None
+            continue
+        last_data_time = time.perf_counter()
+        parser.feed(data)
+        yield from parser.packets()
+
+class Stream_parser():
+    # Incremental parser. Chunks of received data are appended to an internal buffer and a cursor points to the start
+    # of the next packet, so parsed words are never copied again. The already parsed bytes are discarded every time the
+    # complete packets have been yielded, keeping the buffer bounded to (roughly) one packet plus the last chunk.
+    # When a packet is invalid the parser resynchronises at the next preamble pair found at any byte offset, so a
+    # corrupted or lost byte only costs the packets it affects
+    def __init__(self):
+        self.buffer = bytearray()
+        self.cursor = 0 # In bytes
+        self.errors = 0
+        self.dropped_bytes = 0 # Bytes skipped while searching for a preamble
+        self.synced = True # False while the cursor is not at a preamble
+
+    def feed(self, chunk):
+        # The chunk can be raw bytes (as received from the port) or a list of words (ints or hex strings)
+        if (isinstance(chunk, (bytes, bytearray, memoryview))):
+            self.buffer += chunk
+        else:
+            self.buffer += sp.words_to_bytes([w if isinstance(w, int) else int(w, 16) for w in chunk])
+
+    def pending_words(self):
+        return (len(self.buffer) - self.cursor) // sp.WORD_SIZE
+
+    def packets(self):
+        # Generator that yields all the complete packets in the buffer
+        while True:
+            if (not self.synced and not self.resync()):
+                break
+            length = self.next_packet_length()
+            if (length == 0):
+                break
+            if (length > 0 and self.check_packet_checksum(length)):
+                words = self.get_words(length)
+                result, packet = parse_packet(words, check = False)
+                if (result == True):
+                    self.cursor = self.cursor + length * sp.WORD_SIZE
+                    yield packet
+                    continue
+
+            self.errors = self.errors + 1
+            logger.warning("Invalid packet, searching the next preamble. Leftover words: %d", self.pending_words())
+            # The search starts after the preamble of the invalid packet
+            self.cursor = self.cursor + 1
+            self.dropped_bytes = self.dropped_bytes + 1
+            self.synced = False
+        del self.buffer[0:self.cursor]
+        self.cursor = 0
+
+    def next_packet_length(self):
+        # Returns the total words of the packet at the cursor, 0 if more data is needed to know it, or -1 if the data at
+        # the cursor is not the start of a valid packet
+        if (self.pending_words() < pf.PACKET_HEADER_LENGTH):
+            return 0
+        preamble_1, preamble_2, packet_type, size = sp.bytes_to_words(self.buffer[self.cursor:self.cursor + pf.PACKET_HEADER_LENGTH * sp.WORD_SIZE])
+        if (preamble_1 != PREAMBLE_1_WORD or preamble_2 != PREAMBLE_2_WORD):
+            return -1
+
+        if (packet_type in CMD_TYPE_WORDS):
+            length = pf.CMD_PACKET_LENGTH
+        elif (packet_type == REPLY_TYPE_WORD and size >= 3 and size <= pf.MAX_REPLY_PAYLOAD + 3):
+            # Cmd/err word, id word and checksum at least
+            length = pf.PACKET_HEADER_LENGTH + size
+        elif (packet_type == DATA_TYPE_WORD and size >= pf.HEADER_LENGTH + 1 and size <= pf.MAX_PAYLOAD + 1):
+            # Frame header and checksum at least
+            length = pf.PACKET_HEADER_LENGTH + size
+        else:
+            return -1
+
+        if (self.pending_words() < length):
+            return 0
+        return length
+
+    def check_packet_checksum(self, length):
+        # The checksum is verified on the raw data with a single vectorized pass
+        packet_type = sp.bytes_to_words(self.buffer[self.cursor + 2 * sp.WORD_SIZE:self.cursor + 3 * sp.WORD_SIZE])[0]
+        if (packet_type in CMD_TYPE_WORDS):
+            start = self.cursor + (pf.CMD_PACKET_LENGTH - pf.CMD_PAYLOAD_LENGTH - 1) * sp.WORD_SIZE
+        else: # Reply and data checksums start after the size word
+            start = self.cursor + pf.PACKET_HEADER_LENGTH * sp.WORD_SIZE
+        end = self.cursor + (length - 1) * sp.WORD_SIZE
+        checksum = sp.bytes_to_words(self.buffer[end:end + sp.WORD_SIZE])[0]
+        return check_checksum(checksum, self.buffer[start:end])
+
+    def get_words(self, num_words):
+        # Each packet gets its own copy of the words, a view of the buffer would not allow compacting it
+        return np.frombuffer(bytes(self.buffer[self.cursor:self.cursor + num_words * sp.WORD_SIZE]), dtype = "<u4")
+
+    def resync(self):
+        # Moves the cursor to the next preamble pair (at any byte offset). Returns False if there is none in the buffer,
+        # then the bytes that could be the start of a preamble completed by the next chunk are kept
+        index = self.buffer.find(PREAMBLE_BYTES, self.cursor)
+        if (index == -1):
+            index = max(self.cursor, len(self.buffer) - len(PREAMBLE_BYTES) + 1)
+        else:
+            self.synced = True
+        self.dropped_bytes = self.dropped_bytes + index - self.cursor
+        self.cursor = index
+        return self.synced
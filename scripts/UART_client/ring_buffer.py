@@ -0,0 +1,120 @@
+##############################################################################################
+#
+# Company: NASA Goddard Space Flight Center
+# Engineer: Albert Risco
+# Create Date: 10.18.2026
+#
+# Name: ring_buffer.py
+# Description: Preallocated byte ring buffer shared between the serial reader thread (producer) and the modules that
+#              consume the received data (consumers)
+#
+# Dependencies: 
+#
+# Revision 0.01 - File Created
+#
+##############################################################################################
+
+import threading
+import time
+
+DEFAULT_SIZE = 16 * 1024 * 1024 # Bytes
+
+class Ring_buffer():
+    def __init__(self, size : int = DEFAULT_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.size = size
+        self.read_index = 0
+        self.count = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def write(self, data):
+        # Blocks while the buffer is full, the producer is never allowed to overwrite unread data
+        data = memoryview(data).cast("B")
+        written = 0
+        with self.lock:
+            while written < len(data):
+                while self.count == self.size and not self.closed:
+                    self.not_full.wait()
+                if (self.closed):
+                    return written
+
+                n = min(len(data) - written, self.size - self.count)
+                self._copy_in(data[written:written + n])
+                written = written + n
+                self.not_empty.notify_all()
+        return written
+
+    def read(self, num_bytes : int, timeout : float = None):
+        # Returns exactly num_bytes, or an empty bytes object if they are not available before the timeout
+        with self.lock:
+            if (not self._wait_for(num_bytes, timeout)):
+                return b""
+            return self._copy_out(num_bytes)
+
+    def read_available(self, max_bytes : int = None, multiple : int = 1, timeout : float = None):
+        # Returns all the available bytes (up to max_bytes) rounded down to a multiple of 'multiple'. Waits until at
+        # least 'multiple' bytes are available or the timeout expires
+        with self.lock:
+            if (not self._wait_for(multiple, timeout)):
+                return b""
+            n = self.count
+            if (max_bytes != None):
+                n = min(n, max_bytes)
+            return self._copy_out(n - n % multiple)
+
+    def available(self):
+        with self.lock:
+            return self.count
+
+    def clear(self):
+        with self.lock:
+            self.read_index = 0
+            self.count = 0
+            self.not_full.notify_all()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def reopen(self):
+        with self.lock:
+            self.closed = False
+
+    def _wait_for(self, num_bytes, timeout):
+        if (num_bytes > self.size):
+            raise ValueError("Cannot wait for " + str(num_bytes) + " bytes in a buffer of " + str(self.size) + " bytes")
+        end_time = None if timeout == None else time.monotonic() + timeout
+        while self.count < num_bytes:
+            if (self.closed):
+                return False
+            if (end_time == None):
+                self.not_empty.wait()
+            else:
+                remaining = end_time - time.monotonic()
+                if (remaining <= 0):
+                    return False
+                self.not_empty.wait(remaining)
+        return True
+
+    def _copy_in(self, data):
+        write_index = (self.read_index + self.count) % self.size
+        first = min(len(data), self.size - write_index)
+        self.view[write_index:write_index + first] = data[0:first]
+        self.view[0:len(data) - first] = data[first:]
+        self.count = self.count + len(data)
+
+    def _copy_out(self, num_bytes):
+        first = min(num_bytes, self.size - self.read_index)
+        data = bytes(self.view[self.read_index:self.read_index + first])
+        if (first < num_bytes):
+            data = data + bytes(self.view[0:num_bytes - first])
+        self.read_index = (self.read_index + num_bytes) % self.size
+        self.count = self.count - num_bytes
+        self.not_full.notify_all()
+        return data
@@ -16,6 +16,9 @@
 from tabnanny import check
 import struct
 import time
+import logging
+import threading
+import numpy as np
 
 # Custom imports
 import ui as ui
@@ -24,106 +27,355 @@ import serial_port as sp
 import utils as utils
 import receiver as receiver
 import exporter as exporter
+import frame_decoder as fd
+import param_cache as param_cache
 
-def start_read_param():
-    preamble = [pf.PREAMBLE_1, pf.PREAMBLE_2]
-    payload = ["00000000"] * 58
+logger = logging.getLogger(__name__)
+
+ACQUISITION_TIMEOUT = 1 # Seconds without receiving data after which the acquisition is considered finished
+STOP_POLL_PERIOD = 0.05 # Seconds. Max time to send the ST command once the stop has been requested
+REPLY_POLL_PERIOD = 0.01 # Seconds. Max time past the deadline waiting for the replies of a Command_batch
+
+acquisition_thread = None # Acquisition running in the background (interactive mode)
 
-    param_index = ui.get_param(pf.PARAMS_LIST)
-    packet = pf.CMD_packet(preamble = preamble, packet_type = pf.Packet_type.CMD_RB, card_id = pf.CARD_ID, param_id = pf.PARAMS_LIST[param_index], payload_size = len(payload), payload = payload, checksum = utils.calculate_checksum(payload))
+def start_read_param():
+    if (is_acquisition_running()):
+        logger.error("The card ignores the commands during an acquisition, stop it first")
+        return
+    param_id = pf.PARAMS_LIST[ui.get_param(pf.PARAMS_LIST)]
+    packet = build_cmd_packet(pf.Packet_type.CMD_RB, param_id)
     ui.print_about_to_send_packet(packet)
-    send_packet(packet)
 
-    result, packet_words = receiver.wait_data()
-    if (result == True):
-        received_packet = receiver.parse_packet(packet_words)
+    received_packet = send_command(packet)
+    if (received_packet != None):
+        ui.print_reply_packet(received_packet)
 
 def start_write_param():
-    packet = pf.CMD_packet()
-    packet.preamble = [pf.PREAMBLE_1, pf.PREAMBLE_2]
-    packet.packet_type = pf.Packet_type.CMD_WB
-    packet.payload = ["00000000"] * 58
-    
+    if (is_acquisition_running()):
+        logger.error("The card ignores the commands during an acquisition, stop it first")
+        return
     # Get the param id to write
-    packet.param_id = pf.PARAMS_LIST[ui.get_param(pf.PARAMS_LIST)]
-    packet.payload_size = pf.PARAM_ID_TO_SIZE[packet.param_id]
+    param_id = pf.PARAMS_LIST[ui.get_param(pf.PARAMS_LIST)]
 
     # Get the data to write
-    packet.payload[0:packet.payload_size] = [utils.format_int_to_hex_str(p) for p in ui.get_param_data_to_write(packet.param_id, packet.payload_size)]
-
-    packet.checksum = utils.calculate_checksum(packet.payload)
+    data = ui.get_param_data_to_write(param_id, pf.PARAM_ID_TO_SIZE[param_id])
 
+    packet = build_cmd_packet(pf.Packet_type.CMD_WB, param_id, data)
     ui.print_about_to_send_packet(packet)
-    send_packet(packet)
-
-    result, packet_words = receiver.wait_data()
-    if (result == True):
-        received_packet = receiver.parse_packet(packet_words)
 
+    received_packet = send_command(packet)
+    if (received_packet != None):
+        ui.print_reply_packet(received_packet)
 
 def start_acquisition():
-    packet = pf.CMD_packet()
-    packet.preamble = [pf.PREAMBLE_1, pf.PREAMBLE_2]
-    packet.packet_type = pf.Packet_type.CMD_GO
-    packet.param_id = pf.Param_id.RET_DATA_ID
-    packet.payload_size = 1
-    packet.payload = ["00000000"] * 58
-    packet.payload[0] = utils.format_int_to_hex_str(1)
-    packet.checksum = utils.calculate_checksum(packet.payload)
+    global acquisition_thread
+    if (is_acquisition_running()):
+        logger.error("An acquisition is already running")
+        return
 
-    ui.print_about_to_send_packet(packet)
-    send_packet(packet)
+    ui.print_about_to_send_packet(build_cmd_packet(pf.Packet_type.CMD_GO, pf.Param_id.RET_DATA_ID, [1]))
 
-    # If the acq has been successful we will receive more than one packet (at least 2 [reply + data])
-    result, words = receiver.wait_data()
-    if (result == False):
+    # The acquisition runs in the background until it is stopped or the card stops sending data
+    acquisition_thread = Acquisition_thread(exporter.Acquisition_writer())
+    if (not start_acquisition_thread()):
         return
+    print("Acquisition running, select stop to finish it")
 
-
-    # Parse reply packet
-    result, received_packet = receiver.parse_packet(words)
-    if (result == False):
+def start_monitored_acquisition():
+    # Runs the acquisition with the live monitor. The monitor window is shown until it is closed (that stops the
+    # acquisition) or the card stops sending data
+    import live_monitor as lm
+    global acquisition_thread
+    if (is_acquisition_running()):
+        logger.error("An acquisition is already running")
         return
 
-    words = words[received_packet.total_words:]
+    ui.print_about_to_send_packet(build_cmd_packet(pf.Packet_type.CMD_GO, pf.Param_id.RET_DATA_ID, [1]))
 
-    result, data_packets = receiver.parse_data_words(words)
+    monitor = lm.Live_monitor()
+    acquisition_thread = Acquisition_thread(exporter.Acquisition_writer(), monitor = monitor)
+    if (not start_acquisition_thread()):
+        return
+    print("Acquisition running, close the monitor window to stop it")
+    # The monitor also stops when the acquisition ends by itself
+    monitor.stop_when_finished(acquisition_thread)
+    monitor.run()
+    stop_acquisition()
 
-    if (result == True):
-        exporter.export_data_payloads_to_csv(data_packets)
+def start_acquisition_thread():
+    # Sends the GO command of the acquisition thread. If the card does not accept it the reply is shown and no
+    # acquisition is left running. Returns True if the acquisition has started
+    global acquisition_thread
+    reply_packet = acquisition_thread.start()
+    if (is_go_ok(reply_packet)):
+        return True
+    if (reply_packet != None and reply_packet.packet_type == pf.Packet_type.REPLY):
+        ui.print_reply_packet(reply_packet)
+    print("Acquisition not started")
+    acquisition_thread = None
+    return False
 
 def stop_acquisition():
-    print("Stop acquisition")
+    global acquisition_thread
+    if (acquisition_thread == None):
+        logger.error("No acquisition running")
+        return
+
+    acquisition_thread.stop()
+    if (acquisition_thread.reply_packet != None):
+        writer = acquisition_thread.writer
+        print("Acquisition saved to \"" + writer.run_directory + "\": " + str(writer.metadata["frames"]) + " frames, " + 
+              str(acquisition_thread.errors) + " errors")
+    acquisition_thread = None
+
+def is_acquisition_running():
+    return acquisition_thread != None and acquisition_thread.is_alive()
+
+def read_param(param_id : pf.Param_id, timeout : float = sp.TIMEOUT, port : sp.Serial_port = sp.default_port):
+    return send_command(build_cmd_packet(pf.Packet_type.CMD_RB, param_id), timeout, port)
+
+def write_param(param_id : pf.Param_id, values : list, timeout : float = sp.TIMEOUT, port : sp.Serial_port = sp.default_port):
+    if (len(values) != pf.PARAM_ID_TO_SIZE[param_id]):
+        raise ValueError(param_id.name + " expects " + str(pf.PARAM_ID_TO_SIZE[param_id]) + " words, got " + str(len(values)))
+    return send_command(build_cmd_packet(pf.Packet_type.CMD_WB, param_id, values), timeout, port)
+
+def acquire(writer : exporter.Acquisition_writer, timeout : float = ACQUISITION_TIMEOUT, port : sp.Serial_port = sp.default_port,
+            params = None):
+    # Sends the GO command and writes the received frames until the port stays idle for timeout seconds. Returns the
+    # reply to the GO command (None if it was not received) and the number of parsing errors
+    reply_packet, stop_reply_packet, errors = run_acquisition(writer, None, timeout, port, params = params)
+    return reply_packet, errors
+
+def run_acquisition(writer : exporter.Acquisition_writer, stop_event : threading.Event = None,
+                    timeout : float = ACQUISITION_TIMEOUT, port : sp.Serial_port = sp.default_port, monitor = None,
+                    params = None):
+    # Sends the GO command and writes the received frames until the card sends the last frame, the port stays idle for
+    # timeout seconds or stop_event is set (see receive_frames). Returns the replies to the GO and ST commands (None if
+    # not received) and the number of parsing errors. If the card does not accept the GO command nothing is written to
+    # the writer and the function returns right away. The frames are also passed to the monitor (e.g. a
+    # live_monitor.Live_monitor) if given
+    reply_packet, parser, packets = send_go(writer, timeout, port, params, STOP_POLL_PERIOD if stop_event != None else None)
+    if (not is_go_ok(reply_packet)):
+        return reply_packet, None, parser.errors
+    stop_reply_packet, stop_sent = receive_frames(writer, packets, stop_event, port, monitor)
+    return reply_packet, stop_reply_packet, parser.errors
+
+def send_go(writer : exporter.Acquisition_writer, timeout : float = ACQUISITION_TIMEOUT,
+            port : sp.Serial_port = sp.default_port, params = None, poll_period : float = None):
+    # Sends the GO command and waits for its reply. Returns the reply (None if not received), the parser and the
+    # generator of the received packets (see receiver.receive_packets), the frames are read from it once the card has
+    # accepted the command (is_go_ok).
+    # The params in effect are stored in the writer metadata first ("parameters"), the card ignores the commands once
+    # the acquisition has started. They are read through params (a param_cache.Param_cache of the port, e.g. the one of
+    # the Channel_card) so it is also updated
+    if (params == None):
+        params = param_cache.Param_cache(port)
+    params.sync_all()
+    writer.metadata["parameters"] = params.get_snapshot()
+    send_packet(build_cmd_packet(pf.Packet_type.CMD_GO, pf.Param_id.RET_DATA_ID, [1]), port)
+
+    # If the acq has been successful we will receive more than one packet (at least 2 [reply + data]). The packets are
+    # parsed as they are received
+    parser = receiver.Stream_parser()
+    packets = receiver.receive_packets(timeout, parser, port, poll_period)
+
+    # Parse reply packet
+    reply_packet = next((p for p in packets if p != None), None)
+    if (reply_packet == None):
+        logger.error("Wait packet timeout")
+    elif (reply_packet.packet_type != pf.Packet_type.REPLY):
+        logger.error("Reply packet not received")
+        reply_packet = None
+    elif (reply_packet.cmd_type != pf.Cmd_type.GO):
+        logger.error("Unexpected reply to the GO command: %s", reply_packet.cmd_type)
+    elif (reply_packet.err_ok != pf.Ok_err.OK):
+        logger.error("GO command not accepted by the card, error code: 0x%08x",
+                     reply_packet.payload[0] if len(reply_packet.payload) > 0 else 0)
+    return reply_packet, parser, packets
+
+def is_go_ok(reply_packet):
+    return (reply_packet != None and reply_packet.packet_type == pf.Packet_type.REPLY and
+            reply_packet.cmd_type == pf.Cmd_type.GO and reply_packet.err_ok == pf.Ok_err.OK)
+
+def receive_frames(writer : exporter.Acquisition_writer, packets, stop_event : threading.Event = None,
+                   port : sp.Serial_port = sp.default_port, monitor = None):
+    # Writes the frames of packets (returned by send_go) until the card sends the last frame, the port stays idle or
+    # stop_event is set. In the last case the ST command is sent and the frames still in flight are drained (the card
+    # replies to ST after sending its last frame). Returns the reply to the ST command (None if not received or not sent)
+    # and whether it was sent (False if the acquisition finished by itself).
+    # The frames are written to disk as they are parsed, they are never stored in memory. The ST command is sent from
+    # this thread so there is a single consumer of the received data
+    stop_reply_packet = None
+    stop_sent = False
+    for p in packets:
+        if (p == None):
+            pass # No data received in the last poll period
+        elif (p.packet_type == pf.Packet_type.DATA):
+            writer.write_packet(p)
+            if (monitor != None):
+                monitor.write_packet(p)
+            if (fd.is_last_frame(p.payload) and not stop_sent):
+                break
+        elif (p.packet_type == pf.Packet_type.REPLY and stop_sent):
+            stop_reply_packet = p
+            break
+
+        if (stop_event != None and stop_event.is_set() and not stop_sent):
+            send_packet(build_cmd_packet(pf.Packet_type.CMD_ST, pf.Param_id.RET_DATA_ID), port)
+            stop_sent = True
+
+    if (stop_sent and (stop_reply_packet == None or stop_reply_packet.err_ok != pf.Ok_err.OK)):
+        logger.warning("Stop command not acknowledged by the card")
+    writer.flush()
+    return stop_reply_packet, stop_sent
+
+class Acquisition_thread(threading.Thread):
+    # Runs an acquisition in the background. start() sends the GO command from the calling thread and only starts the
+    # thread if the card accepts it. stop() sends the ST command and waits until the in-flight frames have been written
+    # and the writer closed. finished is set if the acquisition ended by itself (last frame or idle port) before the ST
+    # command was sent
+    def __init__(self, writer : exporter.Acquisition_writer, timeout : float = ACQUISITION_TIMEOUT,
+                 port : sp.Serial_port = sp.default_port, monitor = None, params = None):
+        super().__init__(daemon = True)
+        self.writer = writer
+        self.monitor = monitor
+        self.params = params
+        self.timeout = timeout
+        self.port = port
+        self.stop_event = threading.Event()
+        self.reply_packet = None
+        self.stop_reply_packet = None
+        self.errors = 0
+        self.finished = False
+        self.parser = None
+        self.packets = None
+
+    def start(self):
+        # Returns the reply to the GO command (None if not received). If it is not OK the run is discarded (the writer
+        # removes its run directory) and the thread is not started
+        self.reply_packet, self.parser, self.packets = send_go(self.writer, self.timeout, self.port, self.params,
+                                                               STOP_POLL_PERIOD)
+        if (not is_go_ok(self.reply_packet)):
+            self.errors = self.parser.errors
+            self.writer.discard()
+            return self.reply_packet
+        super().start()
+        return self.reply_packet
+
+    def run(self):
+        try:
+            self.stop_reply_packet, stop_sent = receive_frames(self.writer, self.packets, self.stop_event, self.port,
+                                                               self.monitor)
+            self.finished = not stop_sent
+        finally:
+            self.errors = self.parser.errors
+            self.writer.close()
+
+    def stop(self):
+        self.stop_event.set()
+        if (self.is_alive()):
+            self.join()
+
+def send_command(packet : pf.CMD_packet, timeout : float = sp.TIMEOUT, port : sp.Serial_port = sp.default_port):
+    # Returns the reply to the command, None if it was not received
+    return send_commands([packet], timeout, port)[0]
+
+def build_cmd_packet(packet_type : pf.Packet_type, param_id : pf.Param_id, data : list = None, card_id : str = pf.CARD_ID):
+    # data is the list of ints of the command (the param words for WB, the argument for GO/ST). The payload is always
+    # padded up to CMD_PAYLOAD_LENGTH words. Commands without data (RB) report the full payload length as size
+    if (data == None):
+        data = []
+    # Negative values are sent in two's complement
+    payload = np.zeros(pf.CMD_PAYLOAD_LENGTH, dtype = np.uint32)
+    payload[0:len(data)] = [int(d) & 0xFFFFFFFF for d in data]
+    payload_size = len(data) if len(data) > 0 else pf.CMD_PAYLOAD_LENGTH
+    return pf.CMD_packet(preamble = [pf.PREAMBLE_1, pf.PREAMBLE_2], packet_type = packet_type, card_id = card_id,
+                         param_id = param_id, payload_size = payload_size, payload = payload,
+                         checksum = utils.calculate_checksum_words(payload))
+
+class Command_batch():
+    # Queues several commands and sends all of them with a single write. The replies are then matched back to the
+    # commands by command type and param id
+    def __init__(self, port : sp.Serial_port = sp.default_port):
+        self.port = port
+        self.packets = []
+
+    def __len__(self):
+        return len(self.packets)
+
+    def add(self, packet : pf.CMD_packet):
+        self.packets.append(packet)
+        return self
+
+    def add_read(self, param_id : pf.Param_id):
+        return self.add(build_cmd_packet(pf.Packet_type.CMD_RB, param_id))
+
+    def add_write(self, param_id : pf.Param_id, values : list):
+        return self.add(build_cmd_packet(pf.Packet_type.CMD_WB, param_id, values))
+
+    def get_bytes(self):
+        if (len(self.packets) == 0):
+            return b""
+        return sp.words_to_bytes(np.concatenate([get_packet_words(p) for p in self.packets]))
+
+    def send(self, timeout : float = sp.TIMEOUT):
+        # Returns the list of replies in the same order as the commands (None for the commands without reply). timeout
+        # is the overall time to wait for the replies, even if the card keeps sending data (e.g. during an acquisition).
+        # The time the batch and its replies (at most as long as the commands) take on the wire is added to it, so large
+        # batches (e.g. Param_cache.sync_all) are not cut short on slow links
+        data = self.get_bytes()
+        timeout = timeout + 2 * self.port.get_transfer_time(len(data))
+        deadline = time.monotonic() + timeout
+        replies = [None] * len(self.packets)
+        pending = {}
+        for i in range(len(self.packets)):
+            pending.setdefault(get_reply_key(self.packets[i]), []).append(i)
 
-def build_cmd_packet(cmd_type, card_id, param_id, payload_size, payload, checksum):
-    return 
+        self.port.write_bytes(data)
 
+        for packet in receiver.receive_packets(timeout, port = self.port, poll_period = REPLY_POLL_PERIOD):
+            if (time.monotonic() >= deadline):
+                break
+            if (packet == None or packet.packet_type != pf.Packet_type.REPLY):
+                continue
+            indexes = pending.get(get_reply_key(packet))
+            if (indexes == None or len(indexes) == 0):
+                logger.warning("Unexpected reply for param id %s", packet.param_id)
+                continue
+            replies[indexes.pop(0)] = packet
+            if (all(len(i) == 0 for i in pending.values())):
+                break
 
-def send_packet(packet : pf.CMD_packet):
-    send_preamble(packet.preamble)
-    send_packet_type(packet.packet_type)
-    send_id(packet.card_id, packet.param_id)
-    send_payload_size(packet.payload_size)
-    send_payload(packet.payload)
-    send_checksum(packet.checksum)
+        missing = replies.count(None)
+        if (missing > 0):
+            logger.error("%d of %d commands without reply", missing, len(replies))
+        return replies
 
-def send_preamble(preamble : list):
-    for p in preamble:
-        sp.write_word(p)
+def send_commands(packets : list, timeout : float = sp.TIMEOUT, port : sp.Serial_port = sp.default_port):
+    batch = Command_batch(port)
+    for p in packets:
+        batch.add(p)
+    return batch.send(timeout)
 
-def send_packet_type(packet_type : pf.Packet_type):
-    sp.write_word(packet_type.value)
+def get_reply_key(packet):
+    # (Cmd_type, Param_id). Used to match replies and commands
+    if (isinstance(packet, pf.CMD_packet)):
+        return pf.CMD_TYPE_FROM_PACKET_TYPE[packet.packet_type], packet.param_id
+    return packet.cmd_type, packet.param_id
 
-def send_id(card_id : str, param_id : pf.Param_id):
-    sp.write_word(card_id + param_id.value)
 
-def send_payload_size(size : int):
-    s = '{:08x}'.format(size)
-    sp.write_word(s)
+def send_packet(packet : pf.CMD_packet, port : sp.Serial_port = sp.default_port):
+    # The whole packet is sent with a single write
+    port.write_words(get_packet_words(packet))
 
-def send_payload(payload : list):
-    for w in payload:
-        sp.write_word(w)
+def get_packet_words(packet : pf.CMD_packet):
+    # Serialises the packet as uint32 words
+    header = [int(p, 16) for p in packet.preamble] + [int(packet.packet_type.value, 16), 
+                                                      int(packet.card_id + packet.param_id.value, 16), 
+                                                      packet.payload_size]
 
-def send_checksum(checksum : str):
-    sp.write_word(checksum)
+    words = np.empty(len(header) + len(packet.payload) + 1, dtype = np.uint32)
+    words[0:len(header)] = header
+    words[len(header):len(header) + len(packet.payload)] = packet.payload
+    words[-1] = packet.checksum
+    return words
@@ -13,29 +13,162 @@
 ##############################################################################################
 
 import serial
-import time
-import struct
+import threading
+import array
+import sys
+import logging
 # Custom imports
 import packet_fields as pf
+import ring_buffer as rb
+import utils as utils
+
+logger = logging.getLogger(__name__)
 
 PORT_NAME = "COM4"
 BAUDRATE = 2048400 #230400 #19200
 PARITY = "even"
 TIMEOUT = 0.1 # Seconds
+SOCKET_TIMEOUT = 0.005 # Seconds. Read timeout of the socket:// ports, their reads wait for a full chunk or the timeout
+WORD_SIZE = 4 # Bytes
+
+READ_CHUNK_SIZE = 64 * 1024 # Max bytes requested to the OS on each read of the reader thread
+OS_RX_BUFFER_SIZE = 1024 * 1024 # Only applied on platforms that allow it (Windows)
+
+class Serial_reader(threading.Thread):
+    # Thread that keeps pulling chunks from the serial port into the ring buffer. ser.read blocks until data arrives
+    # or the port timeout expires, so there are no busy waits
+    def __init__(self, ser : serial.Serial, ring_buffer : rb.Ring_buffer):
+        threading.Thread.__init__(self, name = "Serial_reader_" + str(ser.port), daemon = True)
+        self.ser = ser
+        self.ring_buffer = ring_buffer
+        self.stop_event = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                # The socket:// ports only report if there is data waiting, not how much
+                in_waiting = READ_CHUNK_SIZE if is_socket_port(self.ser) else self.ser.in_waiting
+                data = self.ser.read(max(1, min(in_waiting, READ_CHUNK_SIZE)))
+                if (len(data) > 0):
+                    self.ring_buffer.write(data)
+        except (serial.SerialException, OSError, TypeError) as e:
+            # The port has been closed or lost
+            if (not self.stop_event.is_set()):
+                self.error = e
+                logger.error("Serial reader stopped: %s", e)
+        finally:
+            self.ring_buffer.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class Serial_port():
+    def __init__(self, ring_buffer_size : int = rb.DEFAULT_SIZE):
+        self.ser = serial.Serial()
+        self.ring_buffer = rb.Ring_buffer(ring_buffer_size)
+        self.reader = None
+
+    def open(self, port_name = PORT_NAME, baudrate = BAUDRATE, parity = PARITY):
+        self.close()
+        if ("://" in port_name):
+            # URL handlers of pyserial, e.g. socket://localhost:7777 for the fpga_emulator
+            self.ser = serial.serial_for_url(port_name, do_not_open = True)
+        print("Initializing \"" + port_name + "\" serial port")
+        print("baudrate = " + str(baudrate))
+        print("parity = " + parity)
+        self.ser.baudrate = baudrate
+        self.ser.port = port_name
+        self.ser.parity = get_parity(parity)
+        self.ser.timeout = SOCKET_TIMEOUT if is_socket_port(self.ser) else TIMEOUT
+        self.ser.open()
+        if (hasattr(self.ser, "set_buffer_size")):
+            self.ser.set_buffer_size(rx_size = OS_RX_BUFFER_SIZE)
+        self.start_reader()
+
+    def close(self):
+        self.stop_reader()
+        self.ser.close()
+
+    def start_reader(self):
+        self.stop_reader()
+        self.ring_buffer.clear()
+        self.ring_buffer.reopen()
+        self.reader = Serial_reader(self.ser, self.ring_buffer)
+        self.reader.start()
+
+    def stop_reader(self):
+        if (self.reader == None):
+            return
+        self.reader.stop()
+        self.ring_buffer.close()
+        self.reader.join()
+        self.reader = None
+
+    def reader_running(self):
+        return self.reader != None and self.reader.is_alive()
+
+    def write_words(self, words):
+        # All the words are sent with a single write call
+        self.ser.write(words_to_bytes(words))
+
+    def write_bytes(self, data):
+        self.ser.write(data)
+
+    def get_transfer_time(self, num_bytes : int):
+        # Seconds needed to send num_bytes at the baudrate of the port (start, 8 data, parity and stop bits per byte)
+        bits_per_byte = 10 if self.ser.parity == serial.PARITY_NONE else 11
+        return num_bytes * bits_per_byte / self.ser.baudrate
 
-ser = serial.Serial()
+    def read_words(self, num_words : int, timeout : float = TIMEOUT):
+        # Returns exactly num_words words, or an empty array if they did not arrive before the timeout
+        if (self.reader != None):
+            return bytes_to_words(self.ring_buffer.read(num_words * WORD_SIZE, timeout))
+        self.ser.timeout = timeout
+        data = self.ser.read(num_words * WORD_SIZE)
+        if (len(data) < num_words * WORD_SIZE):
+            return array.array("I")
+        return bytes_to_words(data)
+
+    def read_available_words(self, timeout : float = TIMEOUT):
+        # Returns all the complete words received so far, waiting up to timeout for at least one of them
+        if (self.reader != None):
+            return bytes_to_words(self.ring_buffer.read_available(multiple = WORD_SIZE, timeout = timeout))
+        self.ser.timeout = timeout
+        return bytes_to_words(self.ser.read(max(WORD_SIZE, self.ser.in_waiting - self.ser.in_waiting % WORD_SIZE)))
+
+    def read_available_bytes(self, timeout : float = TIMEOUT):
+        # Returns all the raw bytes received so far, waiting up to timeout for at least one of them
+        if (self.reader != None):
+            return self.ring_buffer.read_available(timeout = timeout)
+        self.ser.timeout = timeout
+        return self.ser.read(max(1, self.ser.in_waiting))
+
+    def read_data(self, timeout : float = TIMEOUT):
+        # Returns all the words received until the port stays idle for timeout seconds
+        p = []
+        pkt_num = 0
+        while True:
+            words = self.read_available_words(timeout)
+            if (len(words) == 0):
+                return p
+            for w in words:
+                w = format_word(w)
+                p.append(w)
+                if (w == pf.PREAMBLE_1):
+                    logger.debug("Packet received: %d", pkt_num)
+                    pkt_num = pkt_num + 1
+
+
+# Default port used by the module level functions
+default_port = Serial_port()
 
 def init_serial_port(port_name = PORT_NAME, baudrate = BAUDRATE, parity = PARITY):
-    ser.close()
-    print("Initializing \"" + port_name + "\" serial port")
-    print("baudrate = " + str(baudrate))
-    print("parity = " + parity)
-    ser.baudrate = baudrate
-    ser.port = port_name
-    ser.parity = get_parity(parity)
-    ser.timeout = TIMEOUT
-    ser.open()
+    default_port.open(port_name, baudrate, parity)
 
+def close_serial_port():
+    default_port.close()
 
 def get_parity(parity):
     if (parity == "even"):
@@ -44,47 +177,43 @@ def get_parity(parity):
         return serial.PARITY_NONE
 
 def write_word(word):
-    #if (ser == None):
-    #    print("[ERROR] Serial Port not initialized")
-    #    return
-    #print(word, end = " ")
-    word = '{:08x}'.format(struct.unpack("<I", struct.pack(">I", int(word, 16)))[0])
-    #print("Mod: ", word)
-    data = bytes.fromhex(word)
-    ser.write(data)
-
-def read_data():
-    p = []
-    pkt_num = 0
-    w = read_word()
-    p.append(w)
-    if (w == pf.PREAMBLE_1):
-        print("Packet received:", pkt_num)
-        pkt_num = pkt_num + 1
-    while ser.in_waiting > 0:
-
-        w = read_word()
-        p.append(w)
-
-        if (w == pf.PREAMBLE_1):
-            print("Packet received:", pkt_num)
-            pkt_num = pkt_num + 1
-
-        n = 0
-        while (ser.in_waiting == 0):
-            time.sleep(0.001)
-            n = n + 1
-            if (n == 100):
-                break
-
-    return p
+    write_words([int(word, 16)])
+
+def write_words(words):
+    default_port.write_words(words)
+
+def write_bytes(data):
+    default_port.write_bytes(data)
+
+def read_data(timeout = TIMEOUT):
+    return default_port.read_data(timeout)
 
 def read_word():
-    bytes_read = ser.read(4)
-    #return bytes_read
-    w = bytes_read.hex()
-    w = hex(struct.unpack("<I", struct.pack(">I", int(w, 16)))[0]) 
-    w = w[2:len(w)]
-    #print("Word read: " + w)
-    return w
+    return format_word(read_words(1)[0])
+
+def read_words(num_words, timeout = TIMEOUT):
+    return default_port.read_words(num_words, timeout)
+
+def read_available_words(timeout = TIMEOUT):
+    return default_port.read_available_words(timeout)
+
+def read_available_bytes(timeout = TIMEOUT):
+    return default_port.read_available_bytes(timeout)
+
+def words_to_bytes(words):
+    return utils.as_word_array(words).astype("<u4", copy = False).tobytes()
+
+def bytes_to_words(data):
+    data = memoryview(data)
+    data = data[0:len(data) - len(data) % WORD_SIZE]
+    words = array.array("I")
+    words.frombytes(data)
+    if (sys.byteorder == "big"):
+        words.byteswap()
+    return words
+
+def is_socket_port(ser):
+    return isinstance(ser.port, str) and ser.port.startswith("socket://")
 
+def format_word(word):
+    return '{:x}'.format(word)
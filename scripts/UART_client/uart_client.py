@@ -14,16 +14,33 @@
 #
 ##############################################################################################
 
+import argparse
+import logging
+# Custom imports
 import ui as ui
 import serial_port as sp
 import sender as sender
+import batch as batch
 
 
 def main():
+    parser = argparse.ArgumentParser(description = "UART client for the MATESSE channel card")
+    parser.add_argument("-v", "--verbose", action = "store_true", help = "Print the diagnostics of every received packet field")
+    parser.add_argument("-p", "--port", default = None, help = "Serial port name (default: " + sp.PORT_NAME + ")")
+    parser.add_argument("-b", "--batch", default = None, help = "Run the operations of a JSON/YAML batch file and exit")
+    parser.add_argument("-o", "--output", default = None, help = "JSON file where the results of the batch are stored")
+    args = parser.parse_args()
+
+    # The per packet diagnostics are only formatted when the verbose mode is on
+    logging.basicConfig(level = logging.DEBUG if args.verbose else logging.INFO, format = "%(message)s")
+
+    if (args.batch != None):
+        batch.run_batch_file(args.batch, args.port, args.output)
+        return
 
     ui.print_welcome_message()
 
-    sp.init_serial_port()
+    sp.init_serial_port(args.port if args.port != None else sp.PORT_NAME)
 
     while True:
         action = ui.get_user_action()
@@ -39,6 +56,8 @@ def run_action(action):
         sender.start_acquisition()
     elif (action == ui.User_action.stop):
         sender.stop_acquisition()
+    elif (action == ui.User_action.monitor):
+        sender.start_monitored_acquisition()
     else:
         print("Invalid action")
         return
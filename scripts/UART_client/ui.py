@@ -21,6 +21,7 @@ class User_action(Enum):
     write   = 2
     start   = 3
     stop    = 4
+    monitor = 5
 
 def print_welcome_message():
     print("")
@@ -35,6 +36,7 @@ def get_user_action():
         print("[1] Write parameter")
         print("[2] Start Acquisition")
         print("[3] Stop Acquisition")
+        print("[4] Start Acquisition with live monitor")
 
         print("Please choose an action:", end = ' ')
         usr_input = input()
@@ -47,6 +49,8 @@ def get_user_action():
             return User_action.start
         elif (usr_input == str(3)):
             return User_action.stop
+        elif (usr_input == str(4)):
+            return User_action.monitor
         else:
             print ("Invalid Input")
 
@@ -97,11 +101,17 @@ def print_about_to_send_packet(packet : pf.CMD_packet):
     print("Card id: (0x" + packet.card_id + ")")
     print("Param id: "+ packet.param_id.name + " (0x" + packet.param_id.value + ")") 
     print("Payload size: " + str(packet.payload_size))
-    print("Payload: " + str(["0x" + p for p in packet.payload]))
-    print("Checksum: (0x" + packet.checksum + ")\n")
-
-
-
-
-
+    print("Payload: " + str(["0x{:08x}".format(p) for p in packet.payload]))
+    print("Checksum: (0x{:08x})\n".format(packet.checksum))
 
+def print_reply_packet(packet : pf.Reply_packet):
+    print("\nReceived reply with: ")
+    print("Command type: " + (packet.cmd_type.name if packet.cmd_type != None else "NOT OK"))
+    print("Error/OK: " + (packet.err_ok.name if packet.err_ok != None else "NOT OK"))
+    print("Card id: (0x" + packet.card_id + ")")
+    if (isinstance(packet.param_id, pf.Param_id)):
+        print("Param id: " + packet.param_id.name + " (0x" + packet.param_id.value + ")")
+    else:
+        print("Param id: (0x{:04x})".format(packet.param_id))
+    print("Payload size: " + str(packet.payload_size))
+    print("Payload: " + str(["0x{:x}".format(p) for p in packet.payload]) + "\n")
@@ -12,6 +12,8 @@
 #
 ##############################################################################################
 
+import numpy as np
+
 
 def calculate_checksum(content):
     current_checksum = 0
@@ -19,6 +21,20 @@ def calculate_checksum(content):
         current_checksum = current_checksum ^ int(w, 16)
     return '{:08x}'.format(current_checksum)
 
+def calculate_checksum_words(words):
+    # XOR of all the words in a single vectorized pass. words can be a uint32 NumPy array, an array('I'), a list of ints
+    # or the raw received bytes (little-endian words)
+    return int(np.bitwise_xor.reduce(as_word_array(words)))
+
+def as_word_array(words):
+    # Returns the words as a uint32 NumPy array without copying them when possible
+    if (isinstance(words, (bytes, bytearray)) or (isinstance(words, memoryview) and words.format == "B")):
+        return np.frombuffer(words, dtype = "<u4")
+    if (isinstance(words, list) and len(words) > 0 and isinstance(words[0], str)):
+        # Hex strings, as returned by serial_port.read_data
+        return np.array([int(w, 16) for w in words], dtype = np.uint32)
+    return np.asarray(words, dtype = np.uint32)
+
 def format_int_to_hex_str(num):
     #return'{:08x}'.format(num) 
     return '{:08x}'.format(int(hex((num + (1 << 32)) % (1 << 32)), 16))